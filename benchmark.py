@@ -0,0 +1,156 @@
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tracemalloc
+
+from superphone import sync as superphone
+from mock_server import start_server
+
+
+BENCHMARK_SIZES = [1000, 10000, 100000]
+BENCHMARK_TOLERANCE = 0.2 # slowdown against the baseline reported as a regression
+IMPORT_MODULES = ["superphone.cli", "superphone.sync", "superphone.campaign"]
+IMPORT_RUNS = 5
+
+
+# forget the frames & pointers of the previous run
+def reset_state():
+  superphone.current_account().reset()
+
+
+# benchmarked steps, each returns the number of rows it produced
+def sync_contacts():
+  df, total, last = superphone.get_upload_contacts(isUpload=False)
+  return len(df)
+
+def sync_conversations():
+  df, total, last = superphone.get_upload_conversations(isUpload=False)
+  return len(df)
+
+def sync_conversations_normalized():
+  df, total, last = superphone.get_upload_conversations(isUpload=False, isNormalized=True)
+  return len(df)
+
+def build_pointers():
+  return len(superphone.build_pointers())
+
+SCENARIOS = [
+  ("contacts", sync_contacts),
+  ("pointers", build_pointers), # reuses the pointers index of the contacts sync
+  ("conversations", sync_conversations),
+  ("conversations normalized", sync_conversations_normalized),
+]
+
+
+# run one step and measure rows/sec, peak traced memory & requests
+# the mock server runs in this process, so its allocations count towards the peak.
+def measure(server, name, step, records, trace=True):
+  if name != "pointers": reset_state()
+  requests = server.requests
+  if trace: tracemalloc.start()
+  start = time.perf_counter()
+  rows = step()
+  seconds = time.perf_counter() - start
+  peak = 0
+  if trace:
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+  return {
+    'scenario': name,
+    'records': records,
+    'rows': rows,
+    'seconds': round(seconds, 3),
+    'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+    'peak_mb': round(peak / 1024 / 1024, 1),
+    'requests': server.requests - requests,
+  }
+
+
+# best import time of a module in a fresh interpreter, and whether it loads pandas
+def import_time(module, runs=IMPORT_RUNS):
+  code = "import sys, time; start = time.perf_counter(); import {}; print(time.perf_counter() - start, 'pandas' in sys.modules)".format(module)
+  best = None
+  for _ in range(runs):
+    seconds, pandas = subprocess.check_output([sys.executable, "-c", code]).decode().split()
+    best = float(seconds) if best is None else min(best, float(seconds))
+  return {'module': module, 'seconds': round(best, 4), 'pandas': pandas == "True"}
+
+def print_import_times(results):
+  print("{:<24} {:>9} {:>7}".format("module", "seconds", "pandas"))
+  for row in results:
+    print("{module:<24} {seconds:>9} {pandas!s:>7}".format(**row))
+
+
+# compare rows/sec with a saved run
+def regressions(results, baseline, tolerance=BENCHMARK_TOLERANCE):
+  previous = {(row['scenario'], row['records']): row for row in baseline}
+  found = []
+  for row in results:
+    before = previous.get((row['scenario'], row['records']))
+    if before is None or not before['rows_per_sec'] or not row['rows_per_sec']: continue
+    if row['rows_per_sec'] < before['rows_per_sec'] * (1 - tolerance):
+      found.append((row, before))
+  return found
+
+def print_results(results):
+  print("{:<26} {:>8} {:>8} {:>9} {:>12} {:>9} {:>9}".format("scenario", "records", "rows", "seconds", "rows/sec", "peak MB", "requests"))
+  for row in results:
+    print("{scenario:<26} {records:>8} {rows:>8} {seconds:>9} {rows_per_sec:>12} {peak_mb:>9} {requests:>9}".format(**row))
+
+
+# end-to-end sync benchmark against the local mock api
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="benchmark syncs against the local mock api")
+  parser.add_argument("--sizes", type=int, nargs="+", default=BENCHMARK_SIZES)
+  parser.add_argument("--seed", type=int, default=1)
+  parser.add_argument("--latency", type=float, default=0, help="seconds added to every request")
+  parser.add_argument("--error-rate", type=float, default=0, help="share of requests answered with 503")
+  parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc, which slows the run down")
+  parser.add_argument("--save", help="write the results to a json file")
+  parser.add_argument("--baseline", help="json results of an earlier run to compare with")
+  parser.add_argument("--tolerance", type=float, default=BENCHMARK_TOLERANCE)
+  parser.add_argument("--imports", action="store_true", help="measure the import time of the package modules instead")
+  args = parser.parse_args(argv)
+
+  if args.imports:
+    results = [import_time(module) for module in IMPORT_MODULES]
+    print_import_times(results)
+    if args.save:
+      with open(args.save, "w") as f:
+        json.dump(results, f, indent=2)
+    return 0
+
+  results = []
+  for records in args.sizes:
+    server = start_server(records=records, seed=args.seed, port=0, latency=args.latency, error_rate=args.error_rate)
+    # the mock takes any api key, .env is not needed
+    superphone.configure_client(url=server.url, headers={"Authorization": "Bearer benchmark"})
+    try:
+      for name, step in SCENARIOS:
+        results.append(measure(server, name, step, records, trace=not args.no_memory))
+    finally:
+      server.shutdown()
+      server.server_close()
+
+  print_results(results)
+
+  if args.save:
+    with open(args.save, "w") as f:
+      json.dump(results, f, indent=2)
+
+  if args.baseline:
+    with open(args.baseline) as f:
+      found = regressions(results, json.load(f), args.tolerance)
+    for row, before in found:
+      print("regression in {} at {} records: {} rows/sec, was {}".format(row['scenario'], row['records'], row['rows_per_sec'], before['rows_per_sec']))
+    if len(found) > 0:
+      return 1
+
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
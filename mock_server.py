@@ -0,0 +1,419 @@
+import sys
+import gzip
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import graphene
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+
+# local stand-in for the Superphone GraphQL api
+# contacts & conversations are generated from a seeded generator, record i is
+# always the same for the same seed, so nothing is held in memory but removals.
+MOCK_HOST = "127.0.0.1"
+MOCK_PORT = 8765
+MOCK_RECORDS = 1000
+MOCK_SEED = 1
+MOCK_MESSAGES = 30 # most messages of a conversation
+MOCK_BURST = 2 # seconds of rate limit budget the bucket holds
+MOCK_TAGS = ["vip", "new", "wholesale", "newsletter", "event", "returning"]
+MOCK_CITIES = [("Los Angeles", "CA"), ("New York", "NY"), ("Austin", "TX"), ("Miami", "FL"), ("Seattle", "WA"), ("Chicago", "IL")]
+
+
+# generated records
+class MockData:
+  def __init__(self, records=MOCK_RECORDS, seed=MOCK_SEED):
+    self.records = records
+    self.seed = seed
+    self.removed = set()
+    self.sent = 0
+    self.lock = threading.Lock()
+
+  def random(self, kind, i):
+    return random.Random("{}:{}:{}".format(self.seed, kind, i))
+
+  def contact(self, i):
+    rand = self.random("contact", i)
+    city, province = rand.choice(MOCK_CITIES)
+    return {
+      'id': "contact-{}".format(i),
+      'first_name': "First{}".format(i),
+      'last_name': "Last{}".format(i % 97),
+      'email': "user{}@example.com".format(i) if rand.random() < 0.7 else None,
+      'mobile': "+1555{:07d}".format(i),
+      'gender': rand.choice(["MALE", "FEMALE", None]),
+      'birthday': "19{:02d}-{:02d}-{:02d}".format(rand.randint(50, 99), rand.randint(1, 12), rand.randint(1, 28)) if rand.random() < 0.5 else None,
+      'photo': None,
+      'twitter': None,
+      'instagram': "@user{}".format(i) if rand.random() < 0.3 else None,
+      'linkedin': None,
+      'city': city,
+      'province': province,
+      'country': "US",
+      'latitude': rand.uniform(-90, 90),
+      'longitude': rand.uniform(-180, 180),
+      'notes': None,
+      'total_spent': round(rand.uniform(0, 500), 2),
+      'tags': [{'id': "tag-{}".format(name), 'name': name} for name in rand.sample(MOCK_TAGS, rand.randint(0, 3))],
+    }
+
+  def conversation(self, i):
+    rand = self.random("conversation", i)
+    contact = self.contact(i)
+    return {
+      'id': "conversation-{}".format(i),
+      'participant': contact['mobile'],
+      'platform': "TWILIO",
+      'contact': contact,
+      'messages': [{
+        'id': "message-{}-{}".format(i, j),
+        'body': "message {} of conversation {}".format(j, i),
+        'direction': rand.choice(["OUTGOING_TEXT", "INCOMING_TEXT"]),
+        'created_at': "2020-{:02d}-{:02d}T{:02d}:00:00Z".format(1 + i % 12, 1 + j, j % 24),
+      } for j in range(rand.randint(1, MOCK_MESSAGES))],
+    }
+
+  # one page of a connection, cursors are record indexes
+  # first/after walks from the oldest record, last/before from the newest one
+  # and, like the api, lists the newest record first.
+  def page(self, kind, first=None, after=None, last=None, before=None):
+    build = self.contact if kind == "contacts" else self.conversation
+    if first is not None:
+      start = int(after) + 1 if after is not None else 0
+      indexes = range(start, min(self.records, start + first))
+    else:
+      end = int(before) if before is not None else self.records
+      indexes = range(end - 1, max(0, end - (last or 10)) - 1, -1)
+
+    edges = []
+    for i in indexes:
+      node = build(i)
+      if node['id'] in self.removed: continue
+      edges.append({'cursor': str(i), 'node': node})
+    return {'total': self.records - len(self.removed), 'edges': edges}
+
+  # the record of an id, None when it is unknown or removed
+  def node(self, kind, id):
+    prefix = "contact-" if kind == "contacts" else "conversation-"
+    if id in self.removed or not id.startswith(prefix) or not id[len(prefix):].isdigit(): return None
+    i = int(id[len(prefix):])
+    if i >= self.records: return None
+    return self.contact(i) if kind == "contacts" else self.conversation(i)
+
+  def remove(self, id):
+    with self.lock:
+      self.removed.add(id)
+
+  def send(self, mobile, body):
+    with self.lock:
+      self.sent = self.sent + 1
+      return {'id': "sent-{}".format(self.sent), 'body': body, 'direction': "OUTGOING_TEXT", 'created_at': "2020-01-01T00:00:00Z"}
+
+
+# one page of a nested connection, cursors are node indexes
+def nested_page(nodes, first=None, after=None, last=None, before=None):
+  start = int(after) + 1 if after is not None else 0
+  end = min(int(before), len(nodes)) if before is not None else len(nodes)
+  indexes = list(range(start, end))
+  if first is not None: indexes = indexes[:first]
+  if last is not None: indexes = indexes[-last:] if last > 0 else []
+  return {
+    'nodes': [nodes[i] for i in indexes],
+    'page_info': {
+      'has_previous_page': len(indexes) > 0 and indexes[0] > start,
+      'has_next_page': len(indexes) > 0 and indexes[-1] < end - 1,
+      'start_cursor': str(indexes[0]) if len(indexes) > 0 else None,
+      'end_cursor': str(indexes[-1]) if len(indexes) > 0 else None,
+    },
+  }
+
+def nested_arguments():
+  return dict(first=graphene.Int(), after=graphene.String(), last=graphene.Int(), before=graphene.String())
+
+
+# schema
+class PageInfo(graphene.ObjectType):
+  has_next_page = graphene.Boolean()
+  has_previous_page = graphene.Boolean()
+  start_cursor = graphene.String()
+  end_cursor = graphene.String()
+
+class Tag(graphene.ObjectType):
+  id = graphene.ID()
+  name = graphene.String()
+
+class TagConnection(graphene.ObjectType):
+  nodes = graphene.List(Tag)
+  page_info = graphene.Field(PageInfo)
+
+class Message(graphene.ObjectType):
+  id = graphene.ID()
+  body = graphene.String()
+  direction = graphene.String()
+  created_at = graphene.String()
+
+class MessageConnection(graphene.ObjectType):
+  nodes = graphene.List(Message)
+  page_info = graphene.Field(PageInfo)
+
+class Contact(graphene.ObjectType):
+  id = graphene.ID()
+  first_name = graphene.String()
+  last_name = graphene.String()
+  email = graphene.String()
+  mobile = graphene.String()
+  gender = graphene.String()
+  birthday = graphene.String()
+  photo = graphene.String()
+  twitter = graphene.String()
+  instagram = graphene.String()
+  linkedin = graphene.String()
+  city = graphene.String()
+  province = graphene.String()
+  country = graphene.String()
+  latitude = graphene.Float()
+  longitude = graphene.Float()
+  notes = graphene.String()
+  total_spent = graphene.Float()
+  tags = graphene.Field(TagConnection, **nested_arguments())
+
+  def resolve_tags(self, info, **kwargs):
+    return nested_page(self['tags'], **kwargs)
+
+class Conversation(graphene.ObjectType):
+  id = graphene.ID()
+  participant = graphene.String()
+  platform = graphene.String()
+  contact = graphene.Field(Contact)
+  messages = graphene.Field(MessageConnection, **nested_arguments())
+
+  def resolve_messages(self, info, **kwargs):
+    return nested_page(self['messages'], **kwargs)
+
+class ContactEdge(graphene.ObjectType):
+  cursor = graphene.String()
+  node = graphene.Field(Contact)
+
+class ContactConnection(graphene.ObjectType):
+  total = graphene.Int()
+  edges = graphene.List(ContactEdge)
+
+class ConversationEdge(graphene.ObjectType):
+  cursor = graphene.String()
+  node = graphene.Field(Conversation)
+
+class ConversationConnection(graphene.ObjectType):
+  total = graphene.Int()
+  edges = graphene.List(ConversationEdge)
+
+def connection_arguments():
+  return dict(first=graphene.Int(), after=graphene.String(), last=graphene.Int(), before=graphene.String())
+
+class Query(graphene.ObjectType):
+  contacts = graphene.Field(ContactConnection, **connection_arguments())
+  conversations = graphene.Field(ConversationConnection, **connection_arguments())
+  contact = graphene.Field(Contact, id=graphene.ID(required=True))
+  conversation = graphene.Field(Conversation, id=graphene.ID(required=True))
+
+  def resolve_contacts(self, info, **kwargs):
+    return info.context['data'].page("contacts", **kwargs)
+
+  def resolve_conversations(self, info, **kwargs):
+    return info.context['data'].page("conversations", **kwargs)
+
+  def resolve_contact(self, info, id):
+    return info.context['data'].node("contacts", id)
+
+  def resolve_conversation(self, info, id):
+    return info.context['data'].node("conversations", id)
+
+
+class UserError(graphene.ObjectType):
+  field = graphene.List(graphene.String)
+  message = graphene.String()
+
+class RemoveContactInput(graphene.InputObjectType):
+  contact_id = graphene.ID(required=True)
+
+class RemoveConversationInput(graphene.InputObjectType):
+  conversation_id = graphene.ID(required=True)
+
+class SendMessageInput(graphene.InputObjectType):
+  mobile = graphene.String(required=True)
+  platform = graphene.String()
+  body = graphene.String(required=True)
+
+class RemoveContact(graphene.Mutation):
+  class Arguments:
+    input = RemoveContactInput(required=True)
+
+  removed_contact_id = graphene.ID()
+  contact_user_errors = graphene.List(UserError)
+
+  def mutate(self, info, input):
+    info.context['data'].remove(input.contact_id)
+    return RemoveContact(removed_contact_id=input.contact_id, contact_user_errors=[])
+
+class RemoveConversation(graphene.Mutation):
+  class Arguments:
+    input = RemoveConversationInput(required=True)
+
+  removed_conversation_id = graphene.ID()
+  conversation_user_errors = graphene.List(UserError)
+
+  def mutate(self, info, input):
+    info.context['data'].remove(input.conversation_id)
+    return RemoveConversation(removed_conversation_id=input.conversation_id, conversation_user_errors=[])
+
+class SendMessage(graphene.Mutation):
+  class Arguments:
+    input = SendMessageInput(required=True)
+
+  message = graphene.Field(Message)
+  send_message_user_errors = graphene.List(UserError)
+
+  def mutate(self, info, input):
+    if not input.mobile.startswith("+"):
+      return SendMessage(message=None, send_message_user_errors=[UserError(field=["mobile"], message="Mobile is invalid")])
+    return SendMessage(message=info.context['data'].send(input.mobile, input.body), send_message_user_errors=[])
+
+class Mutation(graphene.ObjectType):
+  remove_contact = RemoveContact.Field()
+  remove_conversation = RemoveConversation.Field()
+  send_message = SendMessage.Field()
+
+schema = graphene.Schema(query=Query, mutation=Mutation)
+
+
+# http endpoint with persisted queries, injected latency & errors
+class MockHandler(BaseHTTPRequestHandler):
+  def do_POST(self):
+    server = self.server
+    with server.lock:
+      server.requests = server.requests + 1
+
+    if server.latency > 0:
+      time.sleep(server.latency * server.random.uniform(0.5, 1.5))
+    if server.error_rate > 0 and server.random.random() < server.error_rate:
+      return self.reply(503, {'errors': [{'message': "Service Unavailable"}]})
+    wait = server.take_cost()
+    if wait is not None:
+      return self.reply(429, {'errors': [{'message': "Throttled", 'extensions': {'code': "THROTTLED"}}]}, {'Retry-After': "{:.3f}".format(wait)})
+
+    payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+    query = payload.get('query')
+    persisted = (payload.get('extensions') or {}).get('persistedQuery')
+    if persisted is not None:
+      digest = persisted['sha256Hash']
+      if query is None:
+        query = server.queries.get(digest)
+        if query is None:
+          return self.reply(200, {'errors': [{'message': "PersistedQueryNotFound", 'extensions': {'code': "PERSISTED_QUERY_NOT_FOUND"}}]})
+      elif hashlib.sha256(query.encode("utf-8")).hexdigest() == digest:
+        server.queries[digest] = query
+
+    result = schema.execute(query, variables=payload.get('variables'), operation_name=payload.get('operationName'), context={'data': server.data})
+    body = {'data': result.data}
+    if result.errors:
+      body['errors'] = [{'message': str(error)} for error in result.errors]
+    if server.rate_limit > 0:
+      body['extensions'] = {'cost': server.cost_status()}
+    self.reply(200, body)
+
+  def reply(self, status, body, headers=None):
+    content = json.dumps(body).encode("utf-8")
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json")
+    for name, value in (headers or {}).items():
+      self.send_header(name, value)
+    if "gzip" in self.headers.get('Accept-Encoding', ""):
+      content = gzip.compress(content)
+      self.send_header("Content-Encoding", "gzip")
+    self.send_header("Content-Length", str(len(content)))
+    self.end_headers()
+    self.wfile.write(content)
+
+  def log_message(self, format, *args):
+    pass
+
+class MockServer(ThreadingMixIn, HTTPServer):
+  daemon_threads = True
+
+  def __init__(self, data, host=MOCK_HOST, port=MOCK_PORT, latency=0, error_rate=0, rate_limit=0):
+    super().__init__((host, port), MockHandler)
+    self.data = data
+    self.latency = latency
+    self.error_rate = error_rate
+    self.random = random.Random(data.seed)
+    self.queries = {}
+    self.requests = 0
+    self.throttled = 0
+    self.lock = threading.Lock()
+    # leaky bucket of rate_limit requests per second, each request costs 1
+    self.rate_limit = rate_limit
+    self.available = rate_limit * MOCK_BURST
+    self.updated = time.monotonic()
+
+  # take one request from the bucket, the seconds until the next one when it is empty
+  def take_cost(self):
+    if self.rate_limit <= 0:
+      return None
+    with self.lock:
+      now = time.monotonic()
+      self.available = min(self.rate_limit * MOCK_BURST, self.available + (now - self.updated) * self.rate_limit)
+      self.updated = now
+      if self.available < 1:
+        self.throttled = self.throttled + 1
+        return (1 - self.available) / self.rate_limit
+      self.available = self.available - 1
+      return None
+
+  # cost extension of a response, shaped like the common graphql throttle status
+  def cost_status(self):
+    with self.lock:
+      return {
+        'requestedQueryCost': 1,
+        'throttleStatus': {
+          'maximumAvailable': self.rate_limit * MOCK_BURST,
+          'currentlyAvailable': round(self.available, 3),
+          'restoreRate': self.rate_limit,
+        },
+      }
+
+  @property
+  def url(self):
+    return "http://{}:{}/graphql".format(*self.server_address)
+
+
+# start a mock server in a background thread, port 0 picks a free port
+def start_server(records=MOCK_RECORDS, seed=MOCK_SEED, host=MOCK_HOST, port=MOCK_PORT, latency=0, error_rate=0, rate_limit=0):
+  server = MockServer(MockData(records, seed), host, port, latency, error_rate, rate_limit)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  return server
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="local mock of the Superphone GraphQL api")
+  parser.add_argument("--records", type=int, default=MOCK_RECORDS)
+  parser.add_argument("--seed", type=int, default=MOCK_SEED)
+  parser.add_argument("--host", default=MOCK_HOST)
+  parser.add_argument("--port", type=int, default=MOCK_PORT)
+  parser.add_argument("--latency", type=float, default=0, help="seconds added to every request")
+  parser.add_argument("--error-rate", type=float, default=0, help="share of requests answered with 503")
+  parser.add_argument("--rate-limit", type=float, default=0, help="requests per second before answering 429")
+  args = parser.parse_args(argv)
+
+  server = MockServer(MockData(args.records, args.seed), args.host, args.port, args.latency, args.error_rate, args.rate_limit)
+  print("mock superphone api at", server.url, "with", args.records, "records")
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    server.server_close()
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
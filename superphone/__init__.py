@@ -0,0 +1,4 @@
+# superphone graphql scripts
+# sync contacts & conversations to google sheets, send messages & remove records.
+# the modules are imported on use: `from superphone import sync`, or run the cli
+# with `python -m superphone`.
@@ -0,0 +1,111 @@
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+ACCOUNT_WORKERS = 4
+ACCOUNT_COLLECTIONS = ("conversations", "contacts") # conversations first, they fill the contact activity columns
+
+
+# multi-account sync
+# every account syncs in its own sync.Account (frames, cursors, client & metrics),
+# at most `workers` accounts at a time on a process pool, or on a thread pool
+# when the run is I/O bound, and the results are merged into one report.
+
+
+# accounts from a json file, a list of {"name", "api_key", "spread"} objects
+# a missing api_key | spread falls back to PUBLIC_KEY | SPREAD of .env
+def load_accounts(path):
+  with open(path) as f:
+    accounts = json.load(f)
+  for i, spec in enumerate(accounts):
+    spec.setdefault('name', "account{}".format(i + 1))
+  return accounts
+
+
+# sync the collections of one account, run by the pool workers
+# returns a json safe summary; a failing collection is reported instead of
+# raised so the other collections & accounts still run.
+def sync_account(spec, collections=ACCOUNT_COLLECTIONS, options=None, client_options=None, output=None):
+  from . import sync
+
+  options = dict(options or {})
+  is_normalized = options.pop('isNormalized', False)
+  account = sync.Account(api_key=spec.get('api_key'), spread=spec.get('spread'), name=spec.get('name'))
+  token = sync.use_account(account)
+  start = time.time()
+  result = {'account': account.label(), 'collections': {}, 'errors': []}
+
+  try:
+    sync.configure_client(**(client_options or {}))
+    for collection in sorted(collections, key=ACCOUNT_COLLECTIONS.index):
+      try:
+        if collection == "contacts":
+          df, total, last = sync.get_upload_contacts(**options)
+        else:
+          df, total, last = sync.get_upload_conversations(isNormalized=is_normalized, **options)
+        if output: df.to_csv(output.format(account=account.label(), collection=collection), index=False)
+      except Exception as e:
+        result['errors'].append("{}: {}".format(collection, e))
+        continue
+      result['collections'][collection] = {'rows': len(df), 'total': total, 'metrics': account.metrics.summary()}
+  finally:
+    if account.client is not None: account.client.close()
+    if account.profiler is not None: account.profiler.close()
+    sync.reset_account(token)
+
+  result['seconds'] = round(time.time() - start, 3)
+  return result
+
+
+# sum the metrics counters of every account & collection
+def merge_counters(results):
+  counters = {}
+  for result in results:
+    for summary in result['collections'].values():
+      for name, value in summary['metrics']['counters'].items():
+        counters[name] = counters.get(name, 0) + value
+  return counters
+
+def print_report(report):
+  print("{:<20} {:<14} {:>8} {:>8} {:>9} {:>7} {:>9}".format("account", "collection", "rows", "total", "requests", "errors", "seconds"))
+  for result in report['accounts']:
+    for collection, summary in result['collections'].items():
+      counters = summary['metrics']['counters']
+      print("{:<20} {:<14} {:>8} {:>8} {:>9} {:>7} {:>9}".format(result['account'], collection, summary['rows'], summary['total'], counters['requests'], counters['errors'], summary['metrics']['seconds']))
+    for error in result['errors']:
+      print("{:<20} failed: {}".format(result['account'], error))
+  print("all accounts", report['counters'], "in", report['seconds'], "seconds")
+
+
+# sync many accounts in parallel and write one report
+# threads share the process (and its GIL) but start instantly, processes convert
+# frames in parallel; either way no account sees the state of another.
+def run_accounts(accounts, collections=ACCOUNT_COLLECTIONS, workers=ACCOUNT_WORKERS, threads=False, report_path=None, output=None, client_options=None, **options):
+  pool = ThreadPoolExecutor if threads else ProcessPoolExecutor
+  start = time.time()
+
+  results = []
+  with pool(max_workers=max(1, min(workers, len(accounts)))) as executor:
+    futures = [executor.submit(sync_account, spec, tuple(collections), options, client_options, output) for spec in accounts]
+    for spec, future in zip(accounts, futures):
+      try:
+        results.append(future.result())
+      except Exception as e:
+        # a worker process died, the account has no summary
+        results.append({'account': spec.get('name') or "default", 'collections': {}, 'errors': [str(e)], 'seconds': None})
+
+  report = {
+    'mode': "threads" if threads else "processes",
+    'workers': workers,
+    'seconds': round(time.time() - start, 3),
+    'counters': merge_counters(results),
+    'failed': [result['account'] for result in results if len(result['errors']) > 0],
+    'accounts': results,
+  }
+  print_report(report)
+
+  if report_path:
+    with open(report_path, "w") as f:
+      json.dump(report, f, indent=2, default=str)
+  return report
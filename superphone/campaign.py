@@ -0,0 +1,141 @@
+import os
+import csv
+import time
+import threading
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+from . import sync as superphone
+
+
+CAMPAIGN_RATE = 5 # messages per second
+CAMPAIGN_BURST = 10
+CAMPAIGN_CONCURRENCY = 4
+CAMPAIGN_COLUMNS = [
+  'Mobile',
+  'Body',
+  'Status',
+  'MessageId',
+  'Errors',
+  'Latency',
+  'SentAt',
+]
+
+
+# token bucket rate limit shared by the sending threads
+class TokenBucket:
+  def __init__(self, rate=CAMPAIGN_RATE, capacity=CAMPAIGN_BURST):
+    self.rate = float(rate)
+    self.capacity = float(capacity)
+    self.tokens = float(capacity)
+    self.updated = time.monotonic()
+    self.lock = threading.Lock()
+
+  # block until a token is available
+  def acquire(self):
+    while True:
+      with self.lock:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+          self.tokens = self.tokens - 1
+          return
+        wait = (1 - self.tokens) / self.rate
+      time.sleep(wait)
+
+
+# (mobile, body) pairs from a DataFrame, a Series of mobiles or an iterable
+def campaign_pairs(recipients, body=None):
+  if isinstance(recipients, pd.DataFrame):
+    bodies = recipients['Body'] if body is None else [body] * len(recipients)
+    recipients = zip(recipients['Mobile'], bodies)
+  elif body is not None:
+    recipients = ((mobile, body) for mobile in recipients)
+
+  for mobile, message in recipients:
+    if mobile is None or pd.isna(mobile) or mobile == "": continue
+    yield str(mobile), message
+
+
+# read the results table of a previous run
+def load_results(path):
+  if path is None or not os.path.exists(path):
+    return pd.DataFrame(columns=CAMPAIGN_COLUMNS)
+  return pd.read_csv(path, dtype={'Mobile': str, 'Body': str})
+
+
+# send one message and describe the outcome as a results row
+def send_one(bucket, mobile, message):
+  bucket.acquire()
+  start = time.time()
+  row = {'Mobile': mobile, 'Body': message, 'MessageId': None, 'Errors': None}
+
+  try:
+    result = superphone.run_query(*superphone.mutation_send_message(phone=mobile, message=message))
+    payload = (result.get('data') or {}).get('sendMessage') or {}
+    errors = payload.get('sendMessageUserErrors') or result.get('errors') or []
+    if payload.get('message'):
+      row['Status'] = "sent"
+      row['MessageId'] = payload['message']['id']
+    else:
+      row['Status'] = "rejected"
+    if len(errors) > 0:
+      row['Errors'] = superphone.join_with_none(e.get('message') for e in errors)
+  except Exception as e:
+    row['Status'] = "failed"
+    row['Errors'] = str(e)
+
+  row['Latency'] = round(time.time() - start, 3)
+  row['SentAt'] = start
+  return row
+
+
+# run a messaging campaign
+# sends every (mobile, body) pair through a token bucket with bounded concurrency
+# and appends one results row per recipient to results_path as it completes, so
+# a rerun with the same results_path skips recipients that were already sent.
+def send_campaign(recipients,
+  body=None,
+  results_path=None,
+  rate=CAMPAIGN_RATE,
+  burst=CAMPAIGN_BURST,
+  concurrency=CAMPAIGN_CONCURRENCY):
+
+  previous = load_results(results_path)
+  done = set(zip(previous.loc[previous['Status'] == "sent", 'Mobile'], previous.loc[previous['Status'] == "sent", 'Body']))
+  pairs = [pair for pair in campaign_pairs(recipients, body) if pair not in done]
+  print("campaign recipients", len(pairs), "already sent", len(done))
+
+  bucket = TokenBucket(rate, burst)
+  lock = threading.Lock()
+  rows = []
+
+  results_file = None
+  if results_path is not None:
+    is_new = not os.path.exists(results_path)
+    results_file = open(results_path, "a", newline="")
+    writer = csv.DictWriter(results_file, fieldnames=CAMPAIGN_COLUMNS)
+    if is_new: writer.writeheader()
+
+  def record(future):
+    row = future.result()
+    with lock:
+      rows.append(row)
+      if results_file is not None:
+        writer.writerow(row)
+        results_file.flush()
+
+  try:
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+      for mobile, message in pairs:
+        superphone.submit(executor, send_one, bucket, mobile, message).add_done_callback(record)
+  finally:
+    if results_file is not None: results_file.close()
+
+  results = pd.DataFrame(rows, columns=CAMPAIGN_COLUMNS)
+  if len(results) > 0:
+    print("campaign status", results['Status'].value_counts().to_dict())
+    print("campaign mean latency", results['Latency'].mean())
+
+  return results
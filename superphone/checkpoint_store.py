@@ -0,0 +1,62 @@
+import os
+import json
+import time
+import hashlib
+
+
+CHECKPOINT_FILE = ".superphone_checkpoints.json"
+
+
+# persistent sync checkpoints
+# one entry per collection & api key, stored in a local json file:
+#   cursor          last cursor processed by the running crawl
+#   high_water      newest cursor of the last completed crawl
+#   next_high_water newest cursor of the running crawl, committed on completion
+#   complete        whether the last crawl reached the end
+class CheckpointStore:
+  def __init__(self, path=CHECKPOINT_FILE):
+    self.path = path
+    self.data = {}
+    if os.path.exists(path):
+      with open(path) as f:
+        self.data = json.load(f)
+
+  # api keys are hashed so the file never holds credentials
+  @staticmethod
+  def make_key(collection, api_key):
+    digest = hashlib.sha256(str(api_key).encode("utf-8")).hexdigest()[:16]
+    return "{}:{}".format(collection, digest)
+
+  def get(self, collection, api_key):
+    return dict(self.data.get(self.make_key(collection, api_key), {}))
+
+  def update(self, collection, api_key, **values):
+    key = self.make_key(collection, api_key)
+    state = self.data.setdefault(key, {})
+    state.update(values)
+    state['updated_at'] = time.time()
+    self.flush()
+    return dict(state)
+
+  # record a processed page of a running crawl
+  def save_page(self, collection, api_key, cursor, high_water=None):
+    values = {'cursor': cursor, 'complete': False}
+    if high_water is not None: values['next_high_water'] = high_water
+    return self.update(collection, api_key, **values)
+
+  # mark the crawl complete and commit its high-water mark
+  def complete(self, collection, api_key):
+    state = self.get(collection, api_key)
+    high_water = state.get('next_high_water') or state.get('high_water')
+    return self.update(collection, api_key, cursor=None, complete=True, high_water=high_water, next_high_water=None)
+
+  def reset(self, collection, api_key):
+    self.data.pop(self.make_key(collection, api_key), None)
+    self.flush()
+
+  # write to a temporary file first so a crash never leaves half a file
+  def flush(self):
+    tmp_path = self.path + ".tmp"
+    with open(tmp_path, "w") as f:
+      json.dump(self.data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, self.path)
@@ -0,0 +1,175 @@
+import sys
+import json
+import argparse
+
+
+# command line interface
+#   python -m superphone sync contacts|conversations [options]
+#   python -m superphone accounts accounts.json [--workers N] [--threads] [--report report.json]
+#   python -m superphone send MOBILE MESSAGE
+#   python -m superphone send --csv recipients.csv [--body TEXT] [--results results.csv]
+#   python -m superphone remove contacts|conversations ID [ID ...]
+# every command imports what it needs when it runs, so --help and a one-off
+# send never load pandas or google auth.
+
+
+# sync a collection to its worksheet
+def run_sync(args):
+  from . import sync
+
+  if args.metrics: sync.configure_metrics(args.metrics)
+  if args.profile: sync.configure_profiler(args.profile)
+  if args.cache: sync.configure_cache(mode=args.cache)
+  checkpoint = None
+  if args.checkpoint:
+    from .checkpoint_store import CheckpointStore
+    checkpoint = CheckpointStore(args.checkpoint)
+
+  options = dict(
+    isClear=args.clear,
+    isUpload=not args.no_upload,
+    isBidirectional=args.bidirectional,
+    checkpoint=checkpoint,
+    isIncremental=args.incremental,
+    columns=args.columns.split(",") if args.columns else None,
+    isStream=args.stream,
+    isAdaptive=args.adaptive,
+    isDiff=args.diff,
+    isFullHistory=not args.first_page_only,
+    layout=args.layout)
+  if args.page is not None: options['page'] = args.page
+
+  if args.collection == "contacts":
+    df, total, last = sync.get_upload_contacts(**options)
+  else:
+    df, total, last = sync.get_upload_conversations(isNormalized=args.normalized, **options)
+
+  if args.output: df.to_csv(args.output, index=False)
+  print(args.collection, "rows", len(df), "total", total, "last cursor", last)
+  return 0
+
+# sync many accounts in parallel, one aggregated report
+def run_accounts(args):
+  from .accounts import load_accounts, run_accounts as sync_accounts
+
+  options = dict(
+    isUpload=not args.no_upload,
+    isDiff=args.diff,
+    isNormalized=args.normalized,
+    isFullHistory=not args.first_page_only,
+    layout=args.layout)
+  if args.page is not None: options['page'] = args.page
+
+  report = sync_accounts(
+    load_accounts(args.accounts),
+    collections=args.collections,
+    workers=args.workers,
+    threads=args.threads,
+    report_path=args.report,
+    output=args.output,
+    **options)
+  return 0 if len(report['failed']) == 0 else 1
+
+# send one message, or a campaign from a csv with Mobile & Body columns
+def run_send(args):
+  if args.csv:
+    import pandas as pd
+    from .campaign import send_campaign
+    results = send_campaign(
+      pd.read_csv(args.csv, dtype={'Mobile': str, 'Body': str}),
+      body=args.body,
+      results_path=args.results,
+      rate=args.rate,
+      concurrency=args.concurrency)
+    return 0 if (results['Status'] == "sent").all() else 1
+
+  if args.mobile is None or args.message is None:
+    print("send needs a mobile & a message, or --csv")
+    return 2
+
+  from . import sync
+  result = sync.send_message(args.mobile, args.message)
+  print(json.dumps(result))
+  payload = ((result or {}).get('data') or {}).get('sendMessage') or {}
+  return 0 if payload.get('message') else 1
+
+# remove contacts | conversations by id
+def run_remove(args):
+  from . import sync
+  results = sync.remove_contents(args.collection, args.ids)
+  failed = 0
+  for id, payload in results:
+    print(id, json.dumps(payload))
+    if payload is None: failed = failed + 1
+  return 0 if failed == 0 else 1
+
+
+def make_parser():
+  parser = argparse.ArgumentParser(prog="superphone", description="superphone graphql scripts")
+  parser.add_argument("-v", "--verbose", action="store_true", help="log the metrics events (pages, retries, throttling) as json lines")
+  commands = parser.add_subparsers(dest="command")
+  commands.required = True
+
+  sync = commands.add_parser("sync", help="sync contacts | conversations to google sheets")
+  sync.add_argument("collection", choices=["contacts", "conversations"])
+  sync.add_argument("--page", type=int, help="records per page, the starting size with --adaptive")
+  sync.add_argument("--clear", action="store_true", help="clear the sheet and fetch one page")
+  sync.add_argument("--no-upload", action="store_true", help="fetch without uploading")
+  sync.add_argument("--output", help="also write the frame to a csv file")
+  sync.add_argument("--columns", help="comma separated columns to fetch & upload")
+  sync.add_argument("--layout", choices=["legacy"], help="sheet column layout")
+  sync.add_argument("--normalized", action="store_true", help="one row per conversation and a message history sheet")
+  sync.add_argument("--first-page-only", action="store_true", help="skip the follow-up fetch of truncated messages & tags")
+  sync.add_argument("--bidirectional", action="store_true", help="crawl from both ends")
+  sync.add_argument("--stream", action="store_true", help="parse pages while they download")
+  sync.add_argument("--adaptive", action="store_true", help="adapt the page size to latency")
+  sync.add_argument("--diff", action="store_true", help="upload only the changed rows")
+  sync.add_argument("--checkpoint", help="checkpoint file to resume from")
+  sync.add_argument("--incremental", action="store_true", help="stop at the last synced record, needs --checkpoint")
+  sync.add_argument("--cache", choices=["cache", "record", "replay"], help="response cache mode")
+  sync.add_argument("--metrics", help="metrics summary file, .prom or .json")
+  sync.add_argument("--profile", help="directory for phase profiles")
+  sync.set_defaults(run=run_sync)
+
+  accounts = commands.add_parser("accounts", help="sync many accounts in parallel")
+  accounts.add_argument("accounts", help="json list of {name, api_key, spread} accounts")
+  accounts.add_argument("--collections", nargs="+", choices=["contacts", "conversations"], default=["conversations", "contacts"], help="conversations always sync first")
+  accounts.add_argument("--workers", type=int, default=4, help="accounts synced at once")
+  accounts.add_argument("--threads", action="store_true", help="use threads instead of processes, for I/O bound runs")
+  accounts.add_argument("--report", help="json report of all accounts")
+  accounts.add_argument("--output", help="csv path per account & collection, with {account} and {collection}")
+  accounts.add_argument("--page", type=int, help="records per page")
+  accounts.add_argument("--no-upload", action="store_true", help="fetch without uploading")
+  accounts.add_argument("--layout", choices=["legacy"], help="sheet column layout")
+  accounts.add_argument("--normalized", action="store_true", help="one row per conversation and a message history sheet")
+  accounts.add_argument("--first-page-only", action="store_true", help="skip the follow-up fetch of truncated messages & tags")
+  accounts.add_argument("--diff", action="store_true", help="upload only the changed rows")
+  accounts.set_defaults(run=run_accounts)
+
+  send = commands.add_parser("send", help="send a message or a campaign")
+  send.add_argument("mobile", nargs="?")
+  send.add_argument("message", nargs="?")
+  send.add_argument("--csv", help="recipients csv with a Mobile column and a Body column unless --body")
+  send.add_argument("--body", help="message for every recipient of --csv")
+  send.add_argument("--results", help="campaign results csv, reruns skip sent recipients")
+  send.add_argument("--rate", type=float, default=5, help="messages per second")
+  send.add_argument("--concurrency", type=int, default=4)
+  send.set_defaults(run=run_send)
+
+  remove = commands.add_parser("remove", help="remove contacts | conversations")
+  remove.add_argument("collection", choices=["contacts", "conversations"])
+  remove.add_argument("ids", nargs="+")
+  remove.set_defaults(run=run_remove)
+
+  return parser
+
+def main(argv=None):
+  args = make_parser().parse_args(sys.argv[1:] if argv is None else argv)
+  if args.verbose:
+    import logging
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+  return args.run(args)
+
+
+if __name__ == '__main__':
+  sys.exit(main())
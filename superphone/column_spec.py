@@ -0,0 +1,148 @@
+from collections import OrderedDict
+
+
+join_with_none = lambda list_with_none, seperator=', ': seperator.join(str(v) for v in list_with_none)
+
+# graphql fields of a node
+field = lambda name: lambda node: node[name]
+
+# nested connections come with their page info, so truncated ones can be completed
+TAGS = "tags(first: 10) { nodes { id name } pageInfo { hasNextPage endCursor } }"
+MESSAGES = "messages(last: 10) { nodes { id body direction createdAt } pageInfo { hasPreviousPage startCursor } }"
+NESTED = (TAGS, MESSAGES)
+
+
+# contact columns
+# output column -> (graphql fields it needs, converter from the contact node)
+CONTACT_COLUMNS = OrderedDict([
+  ('id', (['id'], field('id'))),
+  ('Name', (['firstName', 'lastName'], lambda node: node['firstName'] + ' ' + node['lastName'])),
+  ('Gender', (['gender'], field('gender'))),
+  ('Photo', (['photo'], field('photo'))),
+  ('City', (['city'], field('city'))),
+  ('State', (['province'], field('province'))),
+  ('Tags', ([TAGS], lambda node: join_with_none(node['tags']['nodes']))),
+  ('LAST CONTACTED', (['id'], None)),
+  ('SPENT', (['totalSpent'], field('totalSpent'))),
+  ('Email', (['email'], field('email'))),
+  ('Mobile', (['mobile'], field('mobile'))),
+  ('Assigned', ([], lambda node: None)), # empty until an assignee field is selected
+  ('Address', (['city', 'province', 'country'], lambda node: join_with_none([node['city'], node['province'], node['country']]))),
+  ('Instagram', (['instagram'], field('instagram'))),
+  ('Twitter', (['twitter'], field('twitter'))),
+  ('Birthday', (['birthday'], field('birthday'))),
+  ('Notes', (['notes'], field('notes'))),
+  ('Number of Messages Incoming', (['id'], None)),
+  ('Number of Messages Outgoing', (['id'], None)),
+  ('Etc', ([], lambda node: None)),
+])
+
+# contact columns without a converter come from the contact activity index
+
+# contact fields needed to build pointers
+CONTACT_POINTER_FIELDS = ['latitude', 'longitude']
+
+
+# name & photo of the conversation contact, empty without a contact
+def contact_name(node):
+  try:
+    return node['contact']['firstName'] + " " + node['contact']['lastName']
+  except:
+    return ""
+
+def contact_photo(node):
+  try:
+    return node['contact']['photo']
+  except:
+    return ""
+
+
+# conversation columns
+# output column -> (graphql fields it needs, converter from the conversation node);
+# columns without a converter are filled from the messages.
+CONVERSATION_COLUMNS = OrderedDict([
+  ('id', (['id', 'contact { id }'], field('id'))),
+  ('Name', (['contact { firstName lastName }'], contact_name)),
+  ('Photo', (['contact { photo }'], contact_photo)),
+  ('Incoming', ([MESSAGES], None)),
+  ('outgoing', ([MESSAGES], None)),
+  ('Message', ([MESSAGES], None)),
+  ('Date', ([MESSAGES], None)),
+  ('Phone', (['participant'], field('participant'))),
+])
+
+COLUMNS = {
+  "contacts": CONTACT_COLUMNS,
+  "conversations": CONVERSATION_COLUMNS,
+}
+
+
+# graphql fields needed for the columns, in column order without repeats
+def selection_fields(key, columns=None, pointers=False):
+  spec = COLUMNS[key]
+  fields = []
+  for column in spec if columns is None else columns:
+    fields.extend(spec[column][0])
+  if pointers: fields.extend(CONTACT_POINTER_FIELDS)
+  # nested connections are completed by the id of their parent
+  if any(name in NESTED for name in fields): fields.insert(0, 'id')
+  return tuple(OrderedDict.fromkeys(fields))
+
+# selection set text of the fields
+def selection(fields, indent="            "):
+  return "".join("\n" + indent + name for name in fields)
+
+# convert a node into the columns that have a converter
+def convert_columns(key, node, columns=None):
+  spec = COLUMNS[key]
+  row = {}
+  for column in spec if columns is None else columns:
+    convert = spec[column][1]
+    if convert is not None: row[column] = convert(node)
+  return row
+
+# sheet layouts
+# layout -> collection -> sheet column -> column of the frame;
+# legacy is the layout of the former graphql_superphone1 script.
+SHEET_LAYOUTS = {
+  "legacy": {
+    "contacts": OrderedDict([
+      ('Name', 'Name'),
+      ('Gender', 'Gender'),
+      ('photo link', 'Photo'),
+      ('City', 'City'),
+      ('State', 'State'),
+      ('Tags', 'Tags'),
+      ('$ SPENT', 'SPENT'),
+      ('Email', 'Email'),
+      ('Mobile', 'Mobile'),
+      ('Address', 'Address'),
+      ('Instagram', 'Instagram'),
+      ('Twitter', 'Twitter'),
+      ('Birthday', 'Birthday'),
+      ('Notes', 'Notes'),
+      ('Etc', 'Etc'),
+    ]),
+    "conversations": OrderedDict([
+      ('Contact Name', 'Name'),
+      ('Messages Incoming', 'Incoming'),
+      ('Messages outgoing', 'outgoing'),
+      ('Message', 'Message'),
+      ('Date', 'Date'),
+      ('Contact Phone Number', 'Phone'),
+    ]),
+  },
+}
+
+
+# keep only the columns of a row, plus extra keys
+def project_columns(row, columns=None, extra=()):
+  if columns is None: return row
+  return {column: value for column, value in row.items() if column in columns or column in extra}
+
+# select & rename the columns of a frame for a sheet layout, the frame as is without one
+def apply_layout(df, key, layout=None):
+  if layout is None: return df
+  spec = SHEET_LAYOUTS[layout][key]
+  names = [(column, name) for column, name in spec.items() if name in df]
+  return df[[name for _, name in names]].rename(columns={name: column for column, name in names})
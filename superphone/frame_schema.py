@@ -0,0 +1,85 @@
+# column types of the frames
+#   category  low cardinality text repeated across rows
+#   float     numbers, missing values become NaN
+#   Int64     nullable integer counts
+#   datetime  utc timestamps parsed from iso strings, missing values become NaT
+#   date      calendar dates without time or timezone, missing values become NaT
+# columns not listed keep the object type.
+CONTACT_SCHEMA = {
+  'Gender': "category",
+  'City': "category",
+  'State': "category",
+  'SPENT': "float",
+  'Birthday': "date",
+  'LAST CONTACTED': "datetime",
+  'Number of Messages Incoming': "Int64",
+  'Number of Messages Outgoing': "Int64",
+}
+
+CONVERSATION_SCHEMA = {
+  'Incoming': "Int64",
+  'outgoing': "Int64",
+  'Date': "datetime",
+}
+
+MESSAGE_SCHEMA = {
+  'conversation_id': "category",
+  'direction': "category",
+  'createdAt': "datetime",
+}
+
+POINTER_SCHEMA = {
+  'Latitude': "Int64",
+  'Longitude': "Int64",
+  'Numbers': "Int64",
+  'CX': "float",
+  'CY': "float",
+}
+
+
+# convert one column to its type
+def convert_column(series, kind):
+  import pandas as pd
+  if kind == "category":
+    return series.astype("category")
+  if kind == "float":
+    return pd.to_numeric(series, errors="coerce").astype("float64")
+  if kind == "Int64":
+    return pd.to_numeric(series, errors="coerce").astype("Int64")
+  if kind == "datetime":
+    # empty strings stand for a missing date
+    return pd.to_datetime(series.where(series != ""), errors="coerce", utc=True)
+  if kind == "date":
+    # timezone naive, uploaded as the date alone
+    return pd.to_datetime(series.where(series != ""), errors="coerce", format="%Y-%m-%d").dt.normalize()
+  return series.astype(kind)
+
+# memory of a frame in bytes, including the python objects it holds
+def frame_memory(df):
+  return int(df.memory_usage(deep=True).sum())
+
+# frame of sheet safe values for an upload: timestamps as iso text, dates as
+# YYYY-MM-DD, plain python numbers and empty cells for missing values
+def sheet_frame(df):
+  import pandas as pd
+  df = df.copy()
+  for column in df.columns:
+    series = df[column]
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+      df[column] = [value.isoformat() if not pd.isna(value) else "" for value in series]
+    elif pd.api.types.is_datetime64_any_dtype(series):
+      df[column] = [value.strftime("%Y-%m-%d") if not pd.isna(value) else "" for value in series]
+    else:
+      df[column] = series.astype(object).where(series.notna(), "")
+  return df
+
+# apply the schema to the columns of the frame and emit the memory saved to the metrics
+def apply_schema(df, schema, name="frame", metrics=None):
+  before = frame_memory(df)
+  df = df.copy()
+  for column, kind in schema.items():
+    if column in df.columns:
+      df[column] = convert_column(df[column], kind)
+  after = frame_memory(df)
+  if metrics is not None: metrics.emit("memory", frame=name, rows=len(df), before=before, after=after)
+  return df
@@ -0,0 +1,174 @@
+import time
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+LIMIT_INITIAL = 4 # requests in flight at the start
+LIMIT_MIN = 1
+LIMIT_MAX = 10
+LIMIT_INCREASE = 1.0 # requests added per round trip while the api is healthy
+LIMIT_DECREASE = 0.5 # factor applied on throttling
+LIMIT_LATENCY_TOLERANCE = 3.0 # smoothed latency over the best one that counts as congestion
+LIMIT_SLOW_SAMPLES = 3 # consecutive slow responses before the limit is cut
+LIMIT_LATENCY_FLOOR = 1.0 # seconds, faster responses never count as slow
+LIMIT_LATENCY_SMOOTHING = 0.2
+LIMIT_LATENCY_DRIFT = 0.01 # the best latency creeps up so a slower api is relearned
+LIMIT_COST_RESERVE = 0.1 # share of the cost | rate limit budget kept in reserve
+LIMIT_THROTTLE_CODES = ("THROTTLED", "RATE_LIMITED", "RATE_LIMIT_EXCEEDED")
+
+
+# seconds of a Retry-After header, in seconds or as an http date
+def retry_after(headers):
+  value = (headers or {}).get('Retry-After')
+  if not value:
+    return 0
+  try:
+    return max(0.0, float(value))
+  except ValueError:
+    pass
+  try:
+    return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+  except (TypeError, ValueError):
+    return 0
+
+# seconds until a reset time given as epoch seconds, seconds from now or an iso date
+def seconds_until(reset):
+  if reset is None:
+    return 0
+  if isinstance(reset, (int, float)):
+    return max(0.0, reset - time.time()) if reset > 1e9 else max(0.0, float(reset))
+  try:
+    return max(0.0, (datetime.fromisoformat(str(reset).replace("Z", "+00:00")) - datetime.now(timezone.utc)).total_seconds())
+  except ValueError:
+    return 0
+
+# seconds to hold requests back according to the cost | rate limit fields of the
+# response extensions, None while the budget is above the reserve
+#   cost.throttleStatus {maximumAvailable, currentlyAvailable, restoreRate}, cost.requestedQueryCost
+#   rateLimit {limit, remaining, resetAt}
+def budget_wait(extensions, reserve=LIMIT_COST_RESERVE):
+  cost = extensions.get('cost') or {}
+  status = cost.get('throttleStatus') or {}
+  available = status.get('currentlyAvailable')
+  maximum = status.get('maximumAvailable')
+  if available is not None and maximum and available < maximum * reserve:
+    needed = max(cost.get('requestedQueryCost') or 0, maximum * reserve) - available
+    restore = status.get('restoreRate')
+    return needed / restore if restore else 1.0
+
+  limit = extensions.get('rateLimit') or extensions.get('rate_limit') or {}
+  remaining = limit.get('remaining')
+  if remaining is not None and limit.get('limit') and remaining < limit['limit'] * reserve:
+    return seconds_until(limit.get('resetAt', limit.get('reset')))
+
+  return None
+
+# whether a 200 result was refused for throttling
+def is_throttled(result):
+  for error in (result or {}).get('errors') or []:
+    code = (error.get('extensions') or {}).get('code')
+    message = str(error.get('message', '')).lower()
+    if code in LIMIT_THROTTLE_CODES or "throttled" in message or "rate limit" in message:
+      return True
+  return False
+
+
+# adaptive concurrency limit of the requests of one client
+# additive increase while responses are fast and the limit is in use, multiplicative
+# decrease on 429s, throttled results, a low cost budget, slow responses or broken
+# connections; Retry-After & budget waits hold every request back until they pass.
+class AdaptiveLimiter:
+  def __init__(self,
+    initial=LIMIT_INITIAL,
+    min_limit=LIMIT_MIN,
+    max_limit=LIMIT_MAX,
+    increase=LIMIT_INCREASE,
+    decrease=LIMIT_DECREASE,
+    latency_tolerance=LIMIT_LATENCY_TOLERANCE,
+    cost_reserve=LIMIT_COST_RESERVE,
+    metrics=None):
+
+    self.min_limit = min_limit
+    self.max_limit = max(min_limit, max_limit)
+    self.limit = float(min(max(initial, min_limit), self.max_limit))
+    self.increase = increase
+    self.decrease = decrease
+    self.latency_tolerance = latency_tolerance
+    self.cost_reserve = cost_reserve
+    self.metrics = metrics
+    self.inflight = 0
+    self.paused_until = 0.0
+    self.decreased = 0.0 # monotonic time of the last decrease
+    self.latencies = {} # operation shape -> [smoothed latency, best smoothed latency, consecutive slow samples]
+    self.condition = threading.Condition()
+    if metrics is not None: metrics.gauge("concurrency", self.concurrency())
+
+  def concurrency(self):
+    return max(self.min_limit, int(self.limit))
+
+  # wait for a free slot, returns the monotonic start time for release
+  def acquire(self):
+    with self.condition:
+      while True:
+        wait = self.paused_until - time.monotonic()
+        if wait <= 0 and self.inflight < self.concurrency():
+          break
+        self.condition.wait(wait if wait > 0 else None)
+      self.inflight = self.inflight + 1
+      return time.monotonic()
+
+  # free the slot and adapt the limit to the response, status None for a broken connection
+  def release(self, started, latency, operation="query", status=None, headers=None, result=None):
+    with self.condition:
+      full = self.inflight >= self.concurrency()
+      self.inflight = self.inflight - 1
+      previous = self.concurrency()
+
+      if status is None:
+        self.backoff("connection", started)
+      elif status == 429 or (status == 503 and 'Retry-After' in (headers or {})):
+        self.backoff(str(status), started, retry_after(headers))
+      elif is_throttled(result):
+        self.backoff("throttled", started, retry_after(headers))
+      else:
+        wait = budget_wait((result or {}).get('extensions') or {}, self.cost_reserve) if status == 200 else None
+        if wait is not None:
+          self.backoff("cost", started, wait)
+        elif status == 200 and self.is_slow(operation, latency):
+          self.backoff("latency", started)
+        elif status == 200 and full:
+          self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+
+      if self.concurrency() != previous and self.metrics is not None:
+        self.metrics.gauge("concurrency", self.concurrency())
+        self.metrics.emit("concurrency", concurrency=self.concurrency(), previous=previous)
+      self.condition.notify_all()
+
+  # smoothed latency of the operation against the best one seen
+  # operation is a key of requests of similar cost, e.g. the name & number of variables
+  def is_slow(self, operation, latency):
+    stats = self.latencies.get(operation)
+    if stats is None:
+      self.latencies[operation] = [latency, latency, 0]
+      return False
+    stats[0] = stats[0] * (1 - LIMIT_LATENCY_SMOOTHING) + latency * LIMIT_LATENCY_SMOOTHING
+    stats[1] = min(stats[0], stats[1] * (1 + LIMIT_LATENCY_DRIFT))
+    slow = stats[0] > LIMIT_LATENCY_FLOOR and stats[0] > stats[1] * self.latency_tolerance
+    stats[2] = stats[2] + 1 if slow else 0
+    return stats[2] >= LIMIT_SLOW_SAMPLES
+
+  # cut the limit once per round trip, requests sent before the last cut don't cut again
+  def backoff(self, reason, started, wait=0):
+    if wait > 0:
+      self.paused_until = max(self.paused_until, time.monotonic() + wait)
+    previous = self.concurrency()
+    if started >= self.decreased:
+      self.limit = max(self.min_limit, self.limit * self.decrease)
+      self.decreased = time.monotonic()
+      # latencies seen at the old limit don't count against the new one
+      for stats in self.latencies.values():
+        stats[0] = stats[1]
+        stats[2] = 0
+    if self.metrics is not None and (reason != "latency" or self.concurrency() != previous):
+      self.metrics.throttle(reason, self.concurrency(), wait)
@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import msgpack
+from collections import OrderedDict
+from cachetools import LRUCache
+from .sync import is_mutation
+
+
+CACHE_DIR = ".superphone_cache"
+CACHE_MEMORY_ITEMS = 256
+CACHE_DISK_BYTES = 512 * 1024 * 1024
+CACHE_TTL = {
+  "contacts": 60 * 60,
+  "conversations": 10 * 60,
+}
+CACHE_DEFAULT_TTL = 10 * 60
+# collections a mutation changes, unknown mutations invalidate every collection of the scope
+CACHE_INVALIDATES = {
+  "removeContact": ("contacts", "tagsBatch"),
+  "removeConversation": ("conversations", "messagesBatch"),
+  "sendMessage": ("conversations", "messagesBatch"),
+}
+
+# cache modes
+#   cache  read fresh entries, fetch & store misses
+#   record always fetch & store, e.g. to prepare an offline run
+#   replay only read stored entries, whatever their age, and never fetch
+CACHE_MODES = ("cache", "record", "replay")
+
+
+# replay found no stored response
+class CacheMiss(Exception):
+  pass
+
+
+# collection of an operation, getContacts -> contacts
+def cache_collection(query):
+  name = getattr(query, 'name', None) or "query"
+  return name[3:4].lower() + name[4:] if name.startswith("get") else name
+
+# collections changed by a mutation, None for all of them; removeContactBatch -> contacts, tagsBatch
+def invalidated_collections(query):
+  name = getattr(query, 'name', None) or ""
+  if name.endswith("Batch"): name = name[:-len("Batch")]
+  return CACHE_INVALIDATES.get(name)
+
+
+# two tier response cache, an in-memory lru in front of msgpack files on disk
+# entries are scoped to the api key, so accounts sharing the directory never read
+# each other's pages; one lock covers both tiers for the pool threads.
+# files are named <scope>-<collection>-<digest>.msgpack, so a mutation drops the
+# entries of its own scope & collections without reading the directory.
+class ResponseCache:
+  def __init__(self,
+    path=CACHE_DIR,
+    mode="cache",
+    ttl=None,
+    memory_items=CACHE_MEMORY_ITEMS,
+    disk_bytes=CACHE_DISK_BYTES,
+    scope=None):
+
+    if mode not in CACHE_MODES:
+      raise ValueError("cache mode must be one of {}".format(", ".join(CACHE_MODES)))
+    self.path = path
+    self.mode = mode
+    self.ttl = dict(CACHE_TTL, **(ttl or {}))
+    self.memory = LRUCache(maxsize=memory_items)
+    self.disk_bytes = disk_bytes
+    self.hits = 0
+    self.misses = 0
+    self.scope = hashlib.sha256(scope.encode("utf-8")).hexdigest()[:16] if scope else "unscoped"
+    self.lock = threading.RLock()
+    os.makedirs(path, exist_ok=True)
+
+    # file sizes oldest first & their running total, scanned once
+    files = [name for name in os.listdir(path) if name.endswith(".msgpack")]
+    files.sort(key=lambda name: os.path.getmtime(os.path.join(path, name)))
+    self.sizes = OrderedDict((name[:-len(".msgpack")], os.path.getsize(os.path.join(path, name))) for name in files)
+    self.size = sum(self.sizes.values())
+
+  # key of an operation & its variables under the api key scope
+  def make_key(self, query, variables=None):
+    text = getattr(query, 'hash', None) or str(query)
+    digest = hashlib.sha256(json.dumps([self.scope, text, variables or {}], sort_keys=True).encode("utf-8")).hexdigest()
+    return "{}-{}-{}".format(self.scope, cache_collection(query), digest)
+
+  def file_path(self, key):
+    return os.path.join(self.path, key + ".msgpack")
+
+  def get(self, key):
+    with self.lock:
+      entry = self.memory.get(key)
+      if entry is None and os.path.exists(self.file_path(key)):
+        with open(self.file_path(key), "rb") as f:
+          entry = msgpack.unpackb(f.read(), raw=False)
+        self.memory[key] = entry
+    if entry is None:
+      return None
+    if self.mode != "replay" and entry['expires'] < time.time():
+      return None
+    return entry['result']
+
+  def set(self, key, collection, result):
+    entry = {
+      'expires': time.time() + self.ttl.get(collection, CACHE_DEFAULT_TTL),
+      'collection': collection,
+      'result': result,
+    }
+    content = msgpack.packb(entry, use_bin_type=True)
+    with self.lock:
+      self.memory[key] = entry
+      with open(self.file_path(key), "wb") as f:
+        f.write(content)
+      self.size = self.size - self.sizes.pop(key, 0) + len(content)
+      self.sizes[key] = len(content)
+      self.evict()
+
+  # drop the oldest files once the cache directory outgrows its size limit
+  def evict(self):
+    with self.lock:
+      if self.size <= self.disk_bytes:
+        return
+      while len(self.sizes) > 0 and self.size > self.disk_bytes * 0.9:
+        key, size = self.sizes.popitem(last=False)
+        self.size = self.size - size
+        self.memory.pop(key, None)
+        self.remove(key)
+
+  def remove(self, key):
+    try:
+      os.remove(self.file_path(key))
+    except FileNotFoundError:
+      pass
+
+  # drop the entries of this scope in the collections, every collection for None
+  def invalidate(self, collections=None):
+    prefix = self.scope + "-"
+    with self.lock:
+      for key in list(self.sizes):
+        if not key.startswith(prefix): continue
+        if collections is not None and key[len(prefix):].split("-", 1)[0] not in collections: continue
+        self.size = self.size - self.sizes.pop(key)
+        self.memory.pop(key, None)
+        self.remove(key)
+
+  # drop every entry of every scope
+  def clear(self):
+    with self.lock:
+      self.memory.clear()
+      self.sizes.clear()
+      self.size = 0
+      for name in os.listdir(self.path):
+        if name.endswith(".msgpack"): os.remove(os.path.join(self.path, name))
+
+  # run a query through the cache, fetch(query, variables) goes to the network
+  def run(self, query, variables, fetch):
+    if is_mutation(query):
+      if self.mode == "replay":
+        raise CacheMiss("mutations can not be replayed")
+      self.invalidate(invalidated_collections(query))
+      return fetch(query, variables)
+
+    key = self.make_key(query, variables)
+    if self.mode != "record":
+      result = self.get(key)
+      if result is not None:
+        self.hits = self.hits + 1
+        return result
+
+    self.misses = self.misses + 1
+    if self.mode == "replay":
+      raise CacheMiss("no stored response for {} {}".format(cache_collection(query), variables))
+
+    result = fetch(query, variables)
+    if not result.get('errors'):
+      self.set(key, cache_collection(query), result)
+    return result
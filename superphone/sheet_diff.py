@@ -0,0 +1,162 @@
+import os
+import json
+import math
+import hashlib
+import pandas as pd
+from bisect import bisect_left
+
+
+SNAPSHOT_FILE = ".superphone_sheets.json"
+DIFF_CHUNK_CELLS = 20000 # cells per request, well below the sheets request size limit
+DIFF_DELETE_CELLS = 1000 # deleted rows per batch request
+
+
+# A1 column letters of a 1-based column number
+def column_letter(number):
+  letters = ""
+  while number > 0:
+    number, rest = divmod(number - 1, 26)
+    letters = chr(ord('A') + rest) + letters
+  return letters
+
+# json safe cell value
+def cell_value(value):
+  if value is None or value is pd.NA or value is pd.NaT: return ""
+  if isinstance(value, float) and math.isnan(value): return ""
+  if isinstance(value, pd.Timestamp): return value.isoformat()
+  if isinstance(value, (bool, int, float, str)): return value
+  if hasattr(value, 'item'): return cell_value(value.item())
+  return str(value)
+
+def row_hash(values):
+  return hashlib.sha1(json.dumps(values, default=str).encode("utf-8")).hexdigest()
+
+# unique row keys from ids, repeated ids (one row per message) get an occurrence suffix
+def row_keys(ids):
+  seen = {}
+  keys = []
+  for id in ids:
+    count = seen.get(id, 0)
+    seen[id] = count + 1
+    keys.append(str(id) if count == 0 else "{}#{}".format(id, count))
+  return keys
+
+
+# last uploaded state of each worksheet: columns and, per row key, [sheet row, hash]
+class SnapshotStore:
+  def __init__(self, path=SNAPSHOT_FILE):
+    self.path = path
+    self.data = {}
+    if os.path.exists(path):
+      with open(path) as f:
+        self.data = json.load(f)
+
+  def get(self, sheet_name):
+    return self.data.get(sheet_name)
+
+  def set(self, sheet_name, columns, rows):
+    self.data[sheet_name] = {'columns': list(columns), 'rows': rows}
+    tmp_path = self.path + ".tmp"
+    with open(tmp_path, "w") as f:
+      json.dump(self.data, f)
+    os.replace(tmp_path, self.path)
+
+
+# inserts, updates & deletes of the frame against the snapshot rows
+def diff_rows(keys, values, rows):
+  inserts = []
+  updates = []
+  current = set(keys)
+  deletes = [key for key in rows if key not in current]
+
+  for key, row in zip(keys, values):
+    if key not in rows:
+      inserts.append((key, row))
+    elif rows[key][1] != row_hash(row):
+      updates.append((key, row))
+
+  return inserts, updates, deletes
+
+# split rows into chunks of about DIFF_CHUNK_CELLS cells
+def chunks(items, width, chunk_cells=DIFF_CHUNK_CELLS):
+  size = max(1, chunk_cells // max(1, width))
+  for start in range(0, len(items), size):
+    yield items[start:start+size]
+
+
+# rewrite the whole worksheet, used for the first upload or after a column change
+def upload_full(worksheet, columns, keys, values, chunk_cells=DIFF_CHUNK_CELLS):
+  worksheet.clear()
+  table = [list(columns)] + values
+  start = 1
+  for chunk in chunks(table, len(columns), chunk_cells):
+    worksheet.update("A{}".format(start), chunk)
+    start = start + len(chunk)
+  return {key: [i + 2, row_hash(row)] for i, (key, row) in enumerate(zip(keys, values))}
+
+# delete rows bottom up in batch requests and return the shifted row numbers
+def apply_deletes(worksheet, rows, deletes):
+  if len(deletes) == 0:
+    return rows
+  removed = sorted((rows[key][0] for key in deletes), reverse=True)
+  for chunk in chunks(removed, DIFF_DELETE_CELLS):
+    worksheet.spreadsheet.batch_update({'requests': [{
+      'deleteDimension': {
+        'range': {'sheetId': worksheet.id, 'dimension': "ROWS", 'startIndex': row - 1, 'endIndex': row},
+      }} for row in chunk]})
+
+  removed_set = set(deletes)
+  ascending = sorted(removed)
+  shifted = {}
+  for key, (row, digest) in rows.items():
+    if key in removed_set: continue
+    # rows below a deleted row move up by one per deleted row above them
+    shifted[key] = [row - bisect_left(ascending, row), digest]
+  return shifted
+
+# write changed rows as batched range updates
+def apply_updates(worksheet, rows, updates, width, chunk_cells=DIFF_CHUNK_CELLS):
+  last_column = column_letter(width)
+  for chunk in chunks(updates, width, chunk_cells):
+    worksheet.batch_update([{
+      'range': "A{0}:{1}{0}".format(rows[key][0], last_column),
+      'values': [row],
+    } for key, row in chunk])
+    for key, row in chunk:
+      rows[key][1] = row_hash(row)
+
+# append new rows after the last row
+def apply_inserts(worksheet, rows, inserts, width, chunk_cells=DIFF_CHUNK_CELLS):
+  next_row = max([row for row, _ in rows.values()] + [1]) + 1
+  for chunk in chunks(inserts, width, chunk_cells):
+    worksheet.update("A{}".format(next_row), [row for _, row in chunk])
+    for key, row in chunk:
+      rows[key] = [next_row, row_hash(row)]
+      next_row = next_row + 1
+
+
+# upload only the rows that changed since the last upload of the worksheet
+# rows are keyed by ids (kept out of the sheet), changes are applied as deletes,
+# range updates and appends in chunks of about chunk_cells cells; a partial frame
+# holds only some of the records, so rows missing from it are kept.
+# returns the number of inserted, updated & deleted rows
+def upload_diff(df, ids, worksheet, sheet_name, snapshot=None, chunk_cells=DIFF_CHUNK_CELLS, partial=False):
+  if snapshot is None: snapshot = SnapshotStore()
+  columns = list(df.columns)
+  keys = row_keys(ids)
+  values = [[cell_value(value) for value in row] for row in df.itertuples(index=False, name=None)]
+
+  state = snapshot.get(sheet_name)
+  if state is None or state['columns'] != columns:
+    rows = upload_full(worksheet, columns, keys, values, chunk_cells)
+    snapshot.set(sheet_name, columns, rows)
+    return len(rows), 0, 0
+
+  inserts, updates, deletes = diff_rows(keys, values, state['rows'])
+  if partial: deletes = []
+  rows = apply_deletes(worksheet, state['rows'], deletes)
+  apply_updates(worksheet, rows, updates, len(columns), chunk_cells)
+  apply_inserts(worksheet, rows, inserts, len(columns), chunk_cells)
+  snapshot.set(sheet_name, columns, rows)
+
+  return len(inserts), len(updates), len(deletes)
@@ -0,0 +1,1717 @@
+import os
+import re
+import math
+import time
+import asyncio
+import hashlib
+import requests
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from retrying import Retrying
+from functools import lru_cache
+from .column_spec import join_with_none, selection_fields, selection, convert_columns, project_columns, apply_layout
+from .sync_metrics import SyncMetrics
+from .request_limiter import AdaptiveLimiter, is_throttled
+from .frame_schema import CONTACT_SCHEMA, CONVERSATION_SCHEMA, MESSAGE_SCHEMA, POINTER_SCHEMA, apply_schema, sheet_frame
+
+# pandas, gspread_pandas, the response cache & the profiler are imported on the
+# paths that use them, so sending a message never loads them.
+
+
+# configuration from .env, read on first use
+@lru_cache(maxsize=None)
+def get_config():
+  from dotenv import dotenv_values
+  return dotenv_values(".env")
+
+def public_key():
+  return get_config()['PUBLIC_KEY']
+
+URL = "https://api.superphone.io/graphql"
+PAGE_STEP = 25
+DOWNLOAD_STEP = 100
+CONNECT_TIME_OUT = 10
+READ_TIME_OUT = 300
+
+# http client settings
+POOL_SIZE = 10
+RETRY_ATTEMPTS = 5
+RETRY_WAIT_MULTIPLIER = 500 # ms, doubled on every attempt
+RETRY_WAIT_MAX = 30000 # ms
+RETRY_JITTER_MAX = 1000 # ms
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+PERSISTED_QUERIES = True
+ASYNC_CONCURRENCY = POOL_SIZE
+
+# adaptive page size
+PAGE_MIN = 10
+PAGE_MAX = 500
+PAGE_SLOW_SECONDS = 60
+PAGE_GAIN = 0.05 # per record latency must improve by 5% to keep growing
+
+# aliased mutations per request
+BATCH_SIZE = 25
+
+# follow-up fetches of truncated messages & tags
+NESTED_STEP = 100 # nested nodes per parent and request
+NESTED_BATCH_SIZE = 20 # aliased parents per request
+NESTED_CONCURRENCY = None # threads, None follows the maximum of the adaptive request limit
+
+# metrics summary written after each sync, set by METRICS_PATH in .env or configure_metrics;
+# prometheus text for a .prom path, json otherwise, {collection} is replaced by contacts | conversations
+metrics_path = None
+
+# directory of the phase profiles, set by SUPERPHONE_PROFILE in the environment,
+# PROFILE_DIR in .env or configure_profiler; profiling is off without it
+
+
+# pandas data
+# frames are built by the first sync, their columns are:
+frame_columns = {
+  "contacts": [
+    'id', 
+    'Name', 
+    'Gender', 
+    'Photo', 
+    'City', 
+    'State', 
+    'Tags', 
+    'LAST CONTACTED', 
+    'SPENT', 
+    'Email', 
+    # 'Messaging', 
+    'Mobile', 
+    'Assigned', 
+    'Address',
+    'Instagram', 
+    'Twitter', 
+    'Birthday', 
+    # 'Industry', 
+    'Notes', 
+    'Number of Messages Incoming', 
+    'Number of Messages Outgoing', 
+    'Etc',
+    'cursor',
+  ],
+  "conversations": [
+    'id',
+    'Name',
+    'Incoming',
+    'outgoing',
+    'Message',
+    'Date',
+    # 'Link to conversation in Database',
+    'Phone',
+    # 'Phone Number Assigned to User',
+    'cursor',
+  ],
+  # messages of the conversations in normalized mode, one row per message
+  "messages": [
+    'conversation_id',
+    'id',
+    'direction',
+    'body',
+    'createdAt',
+  ],
+  "pointers": [
+    'Latitude', 
+    'Longitude', 
+    'Numbers',
+    'CX',
+    'CY',
+  ],
+}
+
+# empty frame of a collection
+def empty_frame(key):
+  import pandas as pd
+  return pd.DataFrame(columns=frame_columns[key])
+
+POINTER_GRID = 10
+ACTIVITY_COLUMNS = ['LAST CONTACTED', 'Number of Messages Incoming', 'Number of Messages Outgoing']
+
+# callback function to save pointers
+save_pointers = None
+
+# callback function to save conversations
+save_conversations = None
+
+# callback function to save contacts
+save_contacts = None
+
+
+# columnar row buffer
+# rows are kept as one list per column and turned into a DataFrame once,
+# instead of copying the whole frame with df.append for every row.
+# unknown keys become new columns at the end, like df.append does.
+class RowBuffer:
+  def __init__(self, columns):
+    self.columns = list(columns)
+    self.data = {column: [] for column in self.columns}
+    self.size = 0
+
+  def __len__(self):
+    return self.size
+
+  def append(self, row):
+    for column in row:
+      if column not in self.data:
+        self.columns.append(column)
+        self.data[column] = [None] * self.size
+    for column in self.columns:
+      self.data[column].append(row.get(column))
+    self.size = self.size + 1
+
+  def extend(self, rows):
+    for row in rows:
+      self.append(row)
+
+  def clear(self):
+    for column in self.columns:
+      self.data[column] = []
+    self.size = 0
+
+  def to_frame(self, df=None):
+    import pandas as pd
+    frame = pd.DataFrame(self.data, columns=self.columns)
+    if df is None or len(df) == 0:
+      return frame
+    return pd.concat([df, frame], ignore_index=True, sort=False)
+
+
+# write the metrics summaries to the path
+def configure_metrics(path=None):
+  global metrics_path
+  metrics_path = path
+
+# opt-in cProfile & tracemalloc profiles of the sync phases, one profiler per account
+# turn phase profiling of the current account on, writing to the directory, or off without one
+def configure_profiler(directory=None):
+  from .sync_profile import PhaseProfiler, NullProfiler
+  account = current_account()
+  if account.profiler is not None: account.profiler.close()
+  account.profiler = PhaseProfiler(directory) if directory else NullProfiler()
+  return account.profiler
+
+# profiler of the current account, configured from the environment on first use
+def get_profiler():
+  account = current_account()
+  if account.profiler is None:
+    configure_profiler(os.environ.get('SUPERPHONE_PROFILE') or get_config().get('PROFILE_DIR'))
+  return account.profiler
+
+
+# query failed with a http status code
+class QueryError(Exception):
+  def __init__(self, status_code, query, headers=None):
+    super().__init__("Query failed to run by returning code of {}. {}".format(status_code, query))
+    self.status_code = status_code
+    self.retry_after = 'Retry-After' in (headers or {})
+
+# mutations are not idempotent, a resent sendMessage sends the sms again
+def is_mutation(query):
+  operation = getattr(query, 'operation', None)
+  if operation is not None: return operation == "mutation"
+  return str(query).lstrip().startswith("mutation")
+
+# the connection failed before the request reached the server
+def is_connect_error(e):
+  if isinstance(e, requests.ConnectTimeout):
+    return True
+  if not isinstance(e, requests.ConnectionError):
+    return False
+  return isinstance(getattr(e.args[0] if e.args else None, 'reason', None), NewConnectionError)
+
+
+# pooled keep-alive http client with retries
+# every request waits for a slot of the adaptive limiter, which grows while the
+# api answers fast and backs off on throttling, Retry-After & cost budgets.
+class SuperphoneClient:
+  def __init__(self, 
+    url=URL, 
+    headers=None, 
+    metrics=None, 
+    pool_size=POOL_SIZE, 
+    connect_timeout=CONNECT_TIME_OUT, 
+    read_timeout=READ_TIME_OUT, 
+    retry_attempts=RETRY_ATTEMPTS, 
+    retry_wait_multiplier=RETRY_WAIT_MULTIPLIER, 
+    retry_wait_max=RETRY_WAIT_MAX, 
+    retry_jitter_max=RETRY_JITTER_MAX, 
+    retry_status_codes=RETRY_STATUS_CODES,
+    persisted_queries=PERSISTED_QUERIES,
+    limiter=None):
+
+    self.url = url
+    self.metrics = metrics if metrics is not None else SyncMetrics()
+    self.limiter = limiter if limiter is not None else AdaptiveLimiter(max_limit=pool_size, metrics=self.metrics)
+    self.persisted_queries = persisted_queries
+    self.timeout = (connect_timeout, read_timeout)
+    self.retry_status_codes = tuple(retry_status_codes)
+    self.retry_options = dict(
+      stop_max_attempt_number=retry_attempts,
+      wait_exponential_multiplier=retry_wait_multiplier,
+      wait_exponential_max=retry_wait_max,
+      wait_jitter_max=retry_jitter_max)
+
+    self.session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    self.session.mount("https://", adapter)
+    self.session.mount("http://", adapter)
+    self.session.headers.update(headers if headers is not None else {"Authorization": "Bearer {}".format(public_key())})
+    self.session.headers.update({"Accept-Encoding": "gzip", "Connection": "keep-alive"})
+
+  # retry on throttling, server errors and broken connections
+  def is_retryable(self, e):
+    if isinstance(e, QueryError):
+      return e.status_code in self.retry_status_codes
+    return isinstance(e, (requests.ConnectionError, requests.Timeout))
+
+  # retry a mutation only when the server surely did not run it: the connection
+  # failed, or it was throttled; timeouts & gateway errors may come after it ran
+  def is_retryable_mutation(self, e):
+    if isinstance(e, QueryError):
+      return e.status_code == 429 or e.retry_after
+    return is_connect_error(e)
+
+  def send(self, query, payload, read_timeout=None):
+    timeout = self.timeout if read_timeout is None else (self.timeout[0], read_timeout)
+    operation = getattr(query, 'name', "query")
+    # aliased batches of different sizes cost differently
+    shape = "{}/{}".format(operation, len(payload['variables']))
+    # the slot is always freed, a body that is not json counts as a broken response
+    started = self.limiter.acquire()
+    start = time.time()
+    latency = None
+    status, headers, result = None, None, None
+    try:
+      request = self.session.post(self.url, json=payload, timeout=timeout)
+      latency = time.time() - start
+      self.metrics.request(operation, latency, len(request.content), request.status_code)
+      if request.status_code == 200: result = request.json()
+      status, headers = request.status_code, request.headers
+    except (requests.RequestException, ValueError) as e:
+      self.metrics.error(operation, e)
+      raise
+    finally:
+      self.limiter.release(started, latency if latency is not None else time.time() - start, shape, status, headers, result)
+
+    if request.status_code != 200:
+      raise QueryError(request.status_code, query, request.headers)
+    # a throttled result without data is retried like a 429
+    if result.get('data') is None and is_throttled(result):
+      raise QueryError(429, query, request.headers)
+    return result
+
+  # operations are sent by hash first and with the full text only when
+  # the server does not know the hash yet (automatic persisted queries)
+  def post(self, query, variables=None, read_timeout=None):
+    payload = {'variables': variables or {}}
+
+    if isinstance(query, Operation):
+      query.parse()
+      payload['operationName'] = query.name
+      if self.persisted_queries:
+        payload['extensions'] = {'persistedQuery': {'version': 1, 'sha256Hash': query.hash}}
+        try:
+          result = self.send(query, payload, read_timeout)
+          error = persisted_query_error(result)
+        except QueryError as e:
+          if e.status_code != 400: raise
+          error = "PERSISTED_QUERY_NOT_SUPPORTED"
+
+        # a mutation known by its hash may have run, only a server that surely
+        # did not run it gets the text, like is_retryable_mutation
+        if error is None or (error == "PERSISTED_QUERY_FAILED" and query.operation == "mutation"):
+          return result
+        if error == "PERSISTED_QUERY_NOT_SUPPORTED":
+          self.persisted_queries = False
+          del payload['extensions']
+
+    payload['query'] = str(query)
+    result = self.send(query, payload, read_timeout)
+    # a server that answers the text but refused the hash with its own error doesn't support them
+    if 'extensions' in payload and error == "PERSISTED_QUERY_FAILED" and result.get('data') is not None:
+      self.persisted_queries = False
+    return result
+
+  # call with retries, every attempt after the first counts as a retry
+  # retry decides which errors are retried, mutations default to is_retryable_mutation
+  def call(self, function, query, variables=None, retry=None):
+    if retry is None: retry = self.is_retryable_mutation if is_mutation(query) else self.is_retryable
+    attempts = [0]
+    def attempt():
+      attempts[0] = attempts[0] + 1
+      if attempts[0] > 1: self.metrics.retry(getattr(query, 'name', "query"), attempts[0])
+      return function(query, variables)
+    return Retrying(retry_on_exception=retry, **self.retry_options).call(attempt)
+
+  # read_timeout overrides the read timeout of this call
+  def run_query(self, query, variables=None, retry=None, read_timeout=None):
+    return self.call(functools.partial(self.post, read_timeout=read_timeout), query, variables, retry)
+
+  # post the full query and keep the response body as an open stream
+  def post_stream(self, query, variables=None):
+    payload = {'query': str(query), 'variables': variables or {}}
+    if isinstance(query, Operation):
+      query.parse()
+      payload['operationName'] = query.name
+    operation = getattr(query, 'name', "query")
+    started = self.limiter.acquire()
+    start = time.time()
+    status, headers = None, None
+    try:
+      request = self.session.post(self.url, json=payload, timeout=self.timeout, stream=True)
+      # the body is still downloading, only its announced size is known and the
+      # slot is freed at the headers, extensions of a streamed page are not read
+      self.metrics.request(operation, time.time() - start, int(request.headers.get('Content-Length', 0)), request.status_code)
+      status, headers = request.status_code, request.headers
+    except requests.RequestException as e:
+      self.metrics.error(operation, e)
+      raise
+    finally:
+      self.limiter.release(started, time.time() - start, operation, status, headers)
+    if request.status_code != 200:
+      request.close()
+      raise QueryError(request.status_code, query, request.headers)
+    request.raw.decode_content = True
+    return request
+
+  # only opening the stream is retried, edges may already be consumed after that
+  def open_stream(self, query, variables=None):
+    return self.call(self.post_stream, query, variables)
+
+  def close(self):
+    self.session.close()
+
+
+# sync state of one superphone account
+# frames, indexes, cursors, client, response cache & metrics live here, so
+# accounts synced side by side never share state; the api key & spreadsheet
+# default to PUBLIC_KEY & SPREAD of .env.
+class Account:
+  def __init__(self, api_key=None, spread=None, name=None):
+    self.api_key = api_key
+    self.spread = spread
+    self.name = name
+    self.client = None
+    self.cache = None
+    self.metrics = SyncMetrics()
+    self.profiler = None
+    self.reset()
+
+  # forget the frames, indexes & cursors of earlier syncs
+  def reset(self):
+    self.df_contact = None
+    self.df_conversation = None
+    self.df_message = None
+    self.df_pointers = None
+    # pointers grid index
+    # (lat_bin, lng_bin) -> [count, latitude sum, longitude sum]
+    self.pointers = {}
+    # contact activity index, filled while conversations are converted
+    # contact id -> [last message time, incoming count, outgoing count, conversation ids]
+    self.contact_activity = {}
+    # conversation id -> (contact id, last message time, incoming count, outgoing count) it added
+    self.conversation_activity = {}
+    # settled page size per collection
+    self.page_sizes = {}
+    # collection -> whether its last crawl covered the whole connection
+    self.complete = {}
+    # seen cursors set, total count, first & last cursor
+    self.cursors = set()
+    self.total = 0
+    self.first = ""
+    self.last = ""
+
+  def get_api_key(self):
+    return self.api_key if self.api_key is not None else public_key()
+
+  def get_spread(self):
+    return self.spread if self.spread is not None else get_config().get('SPREAD')
+
+  def label(self):
+    return self.name or "default"
+
+# account of the running sync, selected per thread | task with use_account
+default_account = Account()
+account_var = contextvars.ContextVar("superphone_account")
+
+def current_account():
+  return account_var.get(default_account)
+
+# make the account current until reset_account(token)
+def use_account(account):
+  return account_var.set(account)
+
+def reset_account(token):
+  account_var.reset(token)
+
+# the state of the current account reads as module attributes, e.g. sync.df_contact
+ACCOUNT_STATE = ("df_contact", "df_conversation", "df_message", "df_pointers", "pointers", "contact_activity", "conversation_activity", "page_sizes", "cursors", "total", "first", "last", "client", "cache", "metrics", "profiler")
+
+def __getattr__(name):
+  if name in ACCOUNT_STATE:
+    return getattr(current_account(), name)
+  raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+# submit fn to an executor in a copy of the current context, so pool threads
+# keep syncing the account of the caller
+def submit(executor, fn, *args):
+  return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+# replace the client of the current account, e.g. to change pool size or retry policy
+def configure_client(**kwargs):
+  account = current_account()
+  if account.client is not None: account.client.close()
+  kwargs.setdefault('metrics', account.metrics)
+  # the api key of .env is only read when no headers are given, e.g. not for the mock api
+  if 'headers' not in kwargs: kwargs['headers'] = {"Authorization": "Bearer {}".format(account.get_api_key())}
+  account.client = SuperphoneClient(**kwargs)
+  return account.client
+
+# client of the current account, created on first use
+def get_client():
+  account = current_account()
+  if account.client is None: configure_client()
+  return account.client
+
+
+# turn the response cache of the current account on, e.g. configure_cache(mode="replay") for an offline run
+# entries are scoped to the api key of the account
+def configure_cache(**kwargs):
+  from .response_cache import ResponseCache
+  account = current_account()
+  if 'scope' not in kwargs: kwargs['scope'] = account.get_api_key()
+  account.cache = ResponseCache(**kwargs)
+  return account.cache
+
+# turn the response cache off
+def disable_cache():
+  current_account().cache = None
+
+
+# run query
+# A simple function to post the query & variables through the pooled client.
+# options such as retry go to SuperphoneClient.run_query
+def run_query(query, variables=None, **options):
+  fetch = functools.partial(get_client().run_query, **options)
+  cache = current_account().cache
+  if cache is not None:
+    return cache.run(query, variables, fetch)
+  return fetch(query, variables)
+
+        
+# type & name at the start of an operation
+OPERATION_PATTERN = re.compile(r"^(query|mutation|subscription)\s+([_A-Za-z][_0-9A-Za-z]*)")
+
+# named GraphQL operation
+# the document is minified once, and sent by its sha256 hash
+# type & name come from the document, graphql-core parses it on the first send only
+class Operation:
+  def __init__(self, document):
+    self.document = " ".join(document.split())
+    match = OPERATION_PATTERN.match(self.document)
+    if match is None:
+      raise ValueError("expected one named operation: {}".format(self.document))
+    self.operation = match.group(1)
+    self.name = match.group(2)
+    self.hash = hashlib.sha256(self.document.encode("utf-8")).hexdigest()
+    self.parsed = False
+
+  # syntax check of the document, once
+  def parse(self):
+    if self.parsed:
+      return
+    from graphql import parse
+    from graphql.error import GraphQLSyntaxError
+    try:
+      definitions = parse(self.document).definitions
+    except GraphQLSyntaxError as e:
+      raise ValueError("invalid operation {}: {}".format(self.name, e))
+    if len(definitions) != 1 or definitions[0].name is None or definitions[0].name.value != self.name:
+      raise ValueError("expected one named operation: {}".format(self.document))
+    self.parsed = True
+
+  def __str__(self):
+    return self.document
+
+# code of a persisted query error in the result, None when there is none
+# any other error without data is PERSISTED_QUERY_FAILED, servers without persisted
+# queries answer a request without query text in their own words, e.g. "Must provide query string"
+def persisted_query_error(result):
+  errors = result.get('errors') or []
+  for error in errors:
+    code = (error.get('extensions') or {}).get('code') or error.get('message')
+    if code in ("PERSISTED_QUERY_NOT_FOUND", "PersistedQueryNotFound"):
+      return "PERSISTED_QUERY_NOT_FOUND"
+    if code in ("PERSISTED_QUERY_NOT_SUPPORTED", "PersistedQueryNotSupported"):
+      return "PERSISTED_QUERY_NOT_SUPPORTED"
+  if len(errors) > 0 and result.get('data') is None:
+    return "PERSISTED_QUERY_FAILED"
+  return None
+
+
+# The GraphQL query of one page of a connection, defined once per selection with variables for the page & cursor.
+CONNECTION_QUERY = """
+    query %s($first: Int, $after: String, $last: Int, $before: String) {
+      %s(first: $first, after: $after, last: $last, before: $before) {
+        total
+        edges {
+          cursor
+          node {%s
+          }
+        }
+      }
+    }
+    """
+
+@lru_cache(maxsize=None)
+def connection_operation(key, fields):
+  name = "getContacts" if key == "contacts" else "getConversations"
+  return Operation(CONNECTION_QUERY % (name, key, selection(fields)))
+
+QUERY_GET_CONTACTS = connection_operation("contacts", selection_fields("contacts", pointers=True))
+QUERY_GET_CONVERSATIONS = connection_operation("conversations", selection_fields("conversations"))
+
+# variables of one page
+def page_variables(page=10, cursor=None, isFirst=False, isBefore=True):
+  variables = {'first' if isFirst else 'last': page}
+  if cursor is not None: variables['before' if isBefore else 'after'] = cursor
+  return variables
+
+# queries select only the fields the columns need, all columns & pointers by default
+def query_get_contacts(page=10, cursor=None, isFirst=False, isBefore=True, columns=None):
+  fields = selection_fields("contacts", columns, pointers=columns is None)
+  return connection_operation("contacts", fields), page_variables(page, cursor, isFirst, isBefore)
+
+def query_get_conversations(page=10, cursor=None, isFirst=False, isBefore=True, columns=None):
+  fields = selection_fields("conversations", columns)
+  return connection_operation("conversations", fields), page_variables(page, cursor, isFirst, isBefore)
+
+
+# nested connections completed by follow-up fetches:
+# connection -> (parent field, page argument, cursor argument, more flag, cursor field, node fields)
+NESTED_FIELDS = {
+  "messages": ("conversation", "last", "before", "hasPreviousPage", "startCursor", "id body direction createdAt"),
+  "tags": ("contact", "first", "after", "hasNextPage", "endCursor", "id name"),
+}
+NESTED_KEYS = {
+  "contacts": "tags",
+  "conversations": "messages",
+}
+
+# GraphQL query of the next nested page of `size` aliased parents n0, n1, ... with $id0, $cursor0, ...
+@lru_cache(maxsize=None)
+def nested_operation(name, size):
+  parent, page_argument, cursor_argument, more, cursor_field, fields = NESTED_FIELDS[name]
+  arguments = ", ".join("$id{0}: ID!, $cursor{0}: String".format(i) for i in range(size))
+  selections = "".join("""
+      n%d: %s(id: $id%d) {
+        %s(%s: %d, %s: $cursor%d) {
+          nodes { %s }
+          pageInfo { %s %s }
+        }
+      }""" % (i, parent, i, name, page_argument, NESTED_STEP, cursor_argument, i, fields, more, cursor_field) for i in range(size))
+  return Operation("""
+    query get%sBatch(%s) {%s
+    }
+    """ % (name.capitalize(), arguments, selections))
+
+# query & variables of the next nested page of the parents
+def nested_query(name, parents):
+  cursor_field = NESTED_FIELDS[name][4]
+  variables = {}
+  for i, node in enumerate(parents):
+    variables['id{}'.format(i)] = node['id']
+    variables['cursor{}'.format(i)] = node[name]['pageInfo'][cursor_field]
+  return nested_operation(name, len(parents)), variables
+
+
+# GraphQL mutation fields: input type & selection
+MUTATION_FIELDS = {
+  "removeConversation": ("RemoveConversationInput!", """
+        removedConversationId
+        conversationUserErrors {
+          field
+          message
+        }"""),
+  "removeContact": ("RemoveContactInput!", """
+        removedContactId
+        contactUserErrors {
+          field
+          message
+        }"""),
+  "sendMessage": ("SendMessageInput!", """
+        message {
+          id
+        }
+        sendMessageUserErrors {
+          field
+          message
+        }"""),
+}
+
+# GraphQL mutation of one field
+@lru_cache(maxsize=None)
+def mutation_operation(field):
+  input_type, selection = MUTATION_FIELDS[field]
+  return Operation("""
+    mutation %s($input: %s) {
+      %s(input: $input) {%s
+      }
+    }
+    """ % (field, input_type, field, selection))
+
+# GraphQL mutation of `size` aliased fields m0, m1, ... with inputs $input0, $input1, ...
+@lru_cache(maxsize=None)
+def batch_operation(field, size):
+  input_type, selection = MUTATION_FIELDS[field]
+  arguments = ", ".join("$input{}: {}".format(i, input_type) for i in range(size))
+  fields = "".join("""
+      m%d: %s(input: $input%d) {%s
+      }""" % (i, field, i, selection) for i in range(size))
+  return Operation("""
+    mutation %sBatch(%s) {%s
+    }
+    """ % (field, arguments, fields))
+
+# mutation inputs
+def input_remove_conversation(id):
+  return {'conversationId': id}
+
+def input_remove_contact(id):
+  return {'contactId': id}
+
+def input_send_message(phone, message):
+  return {'mobile': phone, 'platform': "TWILIO", 'body': message}
+
+# GraphQL mutation
+def mutation_remove_conversation(id):
+  return mutation_operation("removeConversation"), {'input': input_remove_conversation(id)}
+
+def mutation_remove_contact(id):
+  return mutation_operation("removeContact"), {'input': input_remove_contact(id)}
+
+def mutation_send_message(phone, message):
+  return mutation_operation("sendMessage"), {'input': input_send_message(phone, message)}
+
+
+# grid bin of a coordinate, floored so cells on either side of 0 stay apart
+def pointer_bin(value):
+  return int(math.floor(value / POINTER_GRID)) * POINTER_GRID
+
+# update pointers index according to latitude & longitude
+def update_pointers(lat, lng, cx, cy):
+  pointers = current_account().pointers
+  cell = pointers.get((lat, lng))
+  if cell is None:
+    pointers[(lat, lng)] = [1, cx, cy]
+  else:
+    cell[0] = cell[0] + 1
+    cell[1] = cell[1] + cx
+    cell[2] = cell[2] + cy
+
+# build df_pointers once from the pointers index, CX & CY are cell centroids
+def build_pointers():
+  account = current_account()
+  rows = RowBuffer(frame_columns["pointers"])
+  for (lat, lng), (count, sum_x, sum_y) in account.pointers.items():
+    rows.append({'Latitude':lat,'Longitude':lng,'Numbers':count,'CX':sum_x / count,'CY':sum_y / count})
+  account.df_pointers = apply_schema(rows.to_frame(), POINTER_SCHEMA, "pointers")
+  return account.df_pointers
+
+
+# add the messages of a conversation to the activity of its contact
+# a conversation seen again replaces what it added before
+def update_activity(node):
+  contact_id = (node.get('contact') or {}).get('id')
+  if contact_id is None or 'id' not in node:
+    return
+
+  last_time = None
+  incoming = 0
+  outgoing = 0
+  for msg in node['messages']['nodes'] if 'messages' in node else []:
+    if "OUTGOING_" in msg['direction']: outgoing = outgoing + 1
+    else: incoming = incoming + 1
+    if last_time is None or msg['createdAt'] > last_time: last_time = msg['createdAt']
+
+  account = current_account()
+  contact_activity = account.contact_activity
+  conversation_activity = account.conversation_activity
+  previous = conversation_activity.get(node['id'])
+  if previous is not None:
+    activity = contact_activity[previous[0]]
+    activity[1] = activity[1] - previous[2]
+    activity[2] = activity[2] - previous[3]
+    activity[3].discard(node['id'])
+  conversation_activity[node['id']] = (contact_id, last_time, incoming, outgoing)
+
+  activity = contact_activity.setdefault(contact_id, [None, 0, 0, set()])
+  if last_time is not None and (activity[0] is None or last_time > activity[0]): activity[0] = last_time
+  activity[1] = activity[1] + incoming
+  activity[2] = activity[2] + outgoing
+  activity[3].add(node['id'])
+
+# activity columns of a contact
+# unknown (NA) until conversations were synced, 0 for a contact without conversations
+def activity_columns(contact_id):
+  contact_activity = current_account().contact_activity
+  if len(contact_activity) == 0:
+    return {'LAST CONTACTED': None, 'Number of Messages Incoming': None, 'Number of Messages Outgoing': None}
+  activity = contact_activity.get(contact_id)
+  if activity is None:
+    return {'LAST CONTACTED': None, 'Number of Messages Incoming': 0, 'Number of Messages Outgoing': 0}
+  return {
+    'LAST CONTACTED': activity[0],
+    'Number of Messages Incoming': activity[1],
+    'Number of Messages Outgoing': activity[2],
+  }
+
+# fill the activity columns of contacts converted before their conversations
+def enrich_contacts():
+  account = current_account()
+  df_contact = account.df_contact
+  if len(account.contact_activity) == 0 or df_contact is None or 'id' not in df_contact or len(df_contact) == 0:
+    return df_contact
+
+  rows = [activity_columns(id) for id in df_contact['id']]
+  for column in ACTIVITY_COLUMNS:
+    if column in df_contact: df_contact[column] = [row[column] for row in rows]
+  account.df_contact = apply_schema(df_contact, {column: CONTACT_SCHEMA[column] for column in ACTIVITY_COLUMNS if column in CONTACT_SCHEMA}, "contacts")
+  return account.df_contact
+
+
+# convert contact from node
+def convert_contact(node, columns=None):
+  contact = convert_columns("contacts", node, columns)
+  if 'id' in node:
+    contact.update(project_columns(activity_columns(node['id']), columns))
+
+  try:
+    lat = pointer_bin(node['latitude'])
+    lng = pointer_bin(node['longitude'])
+    update_pointers(lat, lng, node['latitude'], node['longitude'])
+  except:
+    pass
+
+  return contact
+
+# convert conversation from node
+def convert_conversation(node, flag_multiple=True, columns=None):
+  conversation = convert_columns("conversations", node, columns)
+
+  conversation['Incoming'] = 0
+  conversation['outgoing'] = 0
+  conversation['Message'] = ""
+  conversation['Date'] = ""
+      
+  if 'messages' in node and len(node['messages']['nodes']) > 0:
+    if flag_multiple:
+      conversations = []
+
+      for msg in node['messages']['nodes']:
+        try:
+          conversation['Message'] = msg['body']
+          conversation['Date'] = msg['createdAt']
+        except Exception as e:
+          print(e)
+
+        if "OUTGOING_" in msg['direction']:
+          conversation['outgoing'] = conversation['outgoing'] + 1
+        else:
+          conversation['Incoming'] = conversation['Incoming'] + 1
+        
+        conversations.append(project_columns(conversation, columns))
+
+      return conversations
+
+    else:
+      msg = node['messages']['nodes'][0]
+      try:
+        conversation['Message'] = msg['body']
+        conversation['Date'] = msg['createdAt']
+        conversation['messages'] = []
+
+        for msg in node['messages']['nodes']:
+          conversation['messages'].append({
+            'Message' : msg['body'],
+            'Date' : msg['createdAt'],
+            'direction' : msg['direction'],
+          })
+      except Exception as e:
+        print(e)
+
+  return project_columns(conversation, columns, extra=('messages',))
+
+# convert conversation from node into one row with message totals
+# the messages go into their own rows of the messages buffer
+def convert_conversation_normalized(node, messages, columns=None):
+  conversation = convert_columns("conversations", node, columns)
+
+  conversation['Incoming'] = 0
+  conversation['outgoing'] = 0
+  conversation['Message'] = ""
+  conversation['Date'] = ""
+
+  latest = None
+  for msg in node['messages']['nodes'] if 'messages' in node else []:
+    if "OUTGOING_" in msg['direction']:
+      conversation['outgoing'] = conversation['outgoing'] + 1
+    else:
+      conversation['Incoming'] = conversation['Incoming'] + 1
+    if latest is None or msg['createdAt'] > latest['createdAt']:
+      latest = msg
+
+    messages.append({
+      'conversation_id': node.get('id'),
+      'id': msg['id'],
+      'direction': msg['direction'],
+      'body': msg['body'],
+      'createdAt': msg['createdAt'],
+    })
+
+  if latest is not None:
+    conversation['Message'] = latest['body']
+    conversation['Date'] = latest['createdAt']
+
+  return project_columns(conversation, columns)
+
+
+# build the query of one page
+def page_query(key, page, cursor, direction="last", columns=None):
+  query = query_get_contacts if key == "contacts" else query_get_conversations
+  is_first = direction == "first"
+  return query(page=page, cursor=cursor, isFirst=is_first, isBefore=not is_first, columns=columns)
+
+# read total & edges of one page result
+def read_page(key, result):
+  account = current_account()
+
+  account.total = result["data"][key]["total"]
+  datas = result["data"][key]["edges"]
+
+  # first & last cursor
+  if len(datas) > 0:
+    account.first = datas[0]["cursor"]
+    account.last = datas[len(datas)-1]["cursor"]
+
+  return result["data"][key]["total"], datas
+
+# check whether to fetch the page after datas
+def has_next_page(count, datas, next_flag, seen):
+  if not next_flag or count == 0 or len(datas) == 0:
+    return False
+  cursor = datas[len(datas)-1]["cursor"]
+  if cursor in seen:
+    return False
+  seen.add(cursor)
+  return True
+
+
+# adaptive page size
+# doubles the page while the latency per record keeps improving, settles on the
+# best size once it stops improving, and halves it after slow or failed pages.
+class PageSizer:
+  def __init__(self, page=DOWNLOAD_STEP, min_page=PAGE_MIN, max_page=PAGE_MAX, slow_seconds=PAGE_SLOW_SECONDS):
+    self.min_page = min_page
+    self.max_page = max_page
+    self.slow_seconds = slow_seconds
+    self.page = min(max(page, min_page), max_page)
+    self.best = None
+    self.best_page = self.page
+
+  # record the latency of a page of `page` records that returned `records`
+  def record(self, seconds, records, page):
+    if seconds >= self.slow_seconds:
+      self.shrink()
+      return
+    # a short page is the end of the connection, not a measurement
+    if records == 0 or records < page:
+      return
+
+    per_record = seconds / records
+    if self.best is None or per_record < self.best * (1 - PAGE_GAIN):
+      self.best = per_record
+      self.best_page = page
+      self.page = min(self.max_page, page * 2)
+    else:
+      self.page = self.best_page
+
+  # the halved page also caps later growth, so a size that failed is not tried again
+  def shrink(self):
+    self.page = max(self.min_page, self.page // 2)
+    self.max_page = max(self.min_page, min(self.max_page, self.page))
+    self.best_page = min(self.best_page, self.page)
+
+  # client retry policy of a page: a timeout or gateway timeout fails at once so
+  # the page shrinks on the first one, instead of after every client retry
+  def is_retryable(self, e):
+    if self.page > self.min_page and (isinstance(e, requests.Timeout) or (isinstance(e, QueryError) and e.status_code == 504)):
+      return False
+    return get_client().is_retryable(e)
+
+  # a timeout or gateway error is retried on the same cursor with a smaller page
+  def is_shrinkable(self, e):
+    if self.page <= self.min_page:
+      return False
+    if isinstance(e, QueryError):
+      return e.status_code in (502, 503, 504)
+    return isinstance(e, (requests.ConnectionError, requests.Timeout))
+
+
+# iterate pages of a connection
+# yields the edges of one page at a time, walking backward (last/before)
+# or forward (first/after) until the connection is exhausted or a cursor repeats.
+def iter_pages(key, page=DOWNLOAD_STEP, cursor=None, direction="last", next_flag=True, seen=None, columns=None, sizer=None):
+  if seen is None: seen = set()
+
+  while True:
+    # adaptive pages read with a timeout near the slow page latency
+    options = {} if sizer is None else {'retry': sizer.is_retryable, 'read_timeout': sizer.slow_seconds}
+    if sizer is not None: page = sizer.page
+    start = time.time()
+    try:
+      result = run_query(*page_query(key, page, cursor, direction, columns), **options)
+    except Exception as e:
+      if sizer is None or not sizer.is_shrinkable(e): raise
+      sizer.shrink()
+      current_account().metrics.emit("page_size", key=key, page=sizer.page, error=str(e))
+      continue
+
+    count, datas = read_page(key, result)
+    if sizer is not None: sizer.record(time.time() - start, len(datas), page)
+    yield datas
+
+    # next cursor
+    if not has_next_page(count, datas, next_flag, seen):
+      return
+    cursor = datas[len(datas)-1]["cursor"]
+
+
+# stream one page, parsing data.<key>.edges event by event
+# yields ('total', count) and ('edge', edge) as soon as each is complete, so the
+# raw body and the whole parsed page are never held at once.
+def stream_page(key, query, variables=None):
+  import ijson
+
+  prefix = "data.{}".format(key)
+  request = get_client().open_stream(query, variables)
+  builder = None
+  errors = []
+  try:
+    for path, event, value in ijson.parse(request.raw, use_float=True):
+      if path == prefix + ".edges.item" and event == "start_map":
+        builder = ijson.ObjectBuilder()
+      if builder is not None:
+        builder.event(event, value)
+        if path == prefix + ".edges.item" and event == "end_map":
+          yield 'edge', builder.value
+          builder = None
+      elif path == prefix + ".total" and event == "number":
+        yield 'total', value
+      elif path == "errors.item.message":
+        errors.append(value)
+  finally:
+    request.close()
+
+  if len(errors) > 0:
+    raise Exception("Query returned errors. {}".format(join_with_none(errors)))
+
+# iterate pages of a connection in streaming mode
+# every edge is handed to on_edge while the page is still downloading; the
+# yielded pages only keep the cursors of their edges.
+def iter_pages_stream(key, page=DOWNLOAD_STEP, cursor=None, direction="last", next_flag=True, seen=None, columns=None, on_edge=None):
+  if seen is None: seen = set()
+
+  while True:
+    count = None
+    datas = []
+    for event, value in stream_page(key, *page_query(key, page, cursor, direction, columns)):
+      if event == 'total':
+        count = value
+      else:
+        if callable(on_edge): on_edge(value)
+        datas.append({'cursor': value['cursor']})
+
+    if count is None:
+      raise Exception("Query returned no {} page.".format(key))
+    count, datas = read_page(key, {'data': {key: {'total': count, 'edges': datas}}})
+    yield datas
+
+    # next cursor
+    if not has_next_page(count, datas, next_flag, seen):
+      return
+    cursor = datas[len(datas)-1]["cursor"]
+
+
+# iterate pages from both ends of a connection at once
+# a forward cursor walks first/after from the head while a backward cursor walks
+# last/before from the tail, both pages fetched concurrently; the crawl stops
+# when the cursor sets meet, a direction runs out or every record is seen.
+# short pages (deleted records, a capped page size) don't end the crawl; when
+# the seen records don't match the api total the key is added to incomplete.
+def iter_pages_bidirectional(key, page=DOWNLOAD_STEP, columns=None, incomplete=None):
+  seen = set()
+  cursor_first = None
+  cursor_last = None
+  count = 0
+
+  with ThreadPoolExecutor(max_workers=2) as executor:
+    while True:
+      pages = [
+        submit(executor, run_query, *page_query(key, page, cursor_first, "first", columns)),
+        submit(executor, run_query, *page_query(key, page, cursor_last, "last", columns)),
+      ]
+
+      met = False
+      for direction, future in zip(("first", "last"), pages):
+        count, datas = read_page(key, future.result())
+        fresh = [data for data in datas if data["cursor"] not in seen]
+        met = met or len(datas) == 0 or len(fresh) < len(datas)
+        seen.update(data["cursor"] for data in fresh)
+
+        if len(datas) > 0:
+          if direction == "first": cursor_first = datas[len(datas)-1]["cursor"]
+          else: cursor_last = datas[len(datas)-1]["cursor"]
+        if len(fresh) > 0:
+          yield fresh
+
+      if met or count == 0 or len(seen) >= count:
+        break
+
+  if len(seen) != count:
+    current_account().metrics.emit("incomplete", key=key, seen=len(seen), total=count)
+    if incomplete is not None: incomplete.append(key)
+
+
+# check whether a nested connection of the node has more nodes than it got
+def is_truncated(node, name):
+  connection = node.get(name)
+  if connection is None: return False
+  return bool((connection.get('pageInfo') or {}).get(NESTED_FIELDS[name][3]))
+
+# add the fetched nested page to the parents, older messages go first
+def merge_nested(name, parents, result):
+  for i, node in enumerate(parents):
+    parent = result["data"]["n{}".format(i)]
+    if parent is None or parent.get(name) is None:
+      node[name]['pageInfo'] = {}
+      continue
+    connection = parent[name]
+    if NESTED_FIELDS[name][1] == "last":
+      node[name]['nodes'] = connection['nodes'] + node[name]['nodes']
+    else:
+      node[name]['nodes'] = node[name]['nodes'] + connection['nodes']
+    node[name]['pageInfo'] = connection['pageInfo']
+
+# split the truncated parents of a page into batches of aliased parents
+def nested_batches(name, parents, batch_size=NESTED_BATCH_SIZE):
+  return [parents[i:i+batch_size] for i in range(0, len(parents), batch_size)]
+
+# fetch the rest of the truncated messages | tags of a page
+# parents are batched into aliased queries run on a bounded pool, round after
+# round until no connection is truncated, so a page costs a few extra requests.
+def complete_nested(key, datas, batch_size=NESTED_BATCH_SIZE, concurrency=NESTED_CONCURRENCY):
+  name = NESTED_KEYS[key]
+  parents = [data['node'] for data in datas if is_truncated(data['node'], name)]
+  if len(parents) == 0:
+    return 0
+
+  requests_count = 0
+  if concurrency is None: concurrency = get_client().limiter.max_limit
+  with ThreadPoolExecutor(max_workers=concurrency) as executor:
+    while len(parents) > 0:
+      batches = nested_batches(name, parents, batch_size)
+      futures = [submit(executor, run_query, *nested_query(name, batch)) for batch in batches]
+      for batch, future in zip(batches, futures):
+        merge_nested(name, batch, future.result())
+      requests_count = requests_count + len(batches)
+      parents = [node for node in parents if is_truncated(node, name)]
+
+  current_account().metrics.emit("nested", connection=name, requests=requests_count)
+  return requests_count
+
+
+# convert one page of edges into the row buffer
+def convert_page(key, datas, buffer, flag_conversation_multiple=True, columns=None, messages=None):
+  for data in datas:
+    convert_edge(key, data, buffer, flag_conversation_multiple, columns, messages)
+
+# convert one edge into the row buffer
+# with a messages buffer, conversations are normalized into it
+def convert_edge(key, data, buffer, flag_conversation_multiple=True, columns=None, messages=None):
+  convert = convert_contact if key == "contacts" else convert_conversation
+  node = data['node']
+  if key == "conversations": update_activity(node)
+
+  # check normalized | multiple conversations
+  if messages is not None and key == "conversations":
+    dict_node = convert_conversation_normalized(node, messages, columns=columns)
+  elif not flag_conversation_multiple and key == "conversations":
+    dict_node = convert(node, flag_multiple=False, columns=columns)
+  else:
+    dict_node = convert(node, columns=columns)
+
+  if type(dict_node) == type([]):
+    for dict_node_one in dict_node:
+      # add cursor to dict_node
+      dict_node_one['cursor'] = data['cursor']
+      buffer.append(dict_node_one)
+  else:
+    # add cursor to dict_node
+    dict_node['cursor'] = data['cursor']
+    buffer.append(dict_node)
+
+
+# start collecting rows of a collection
+def start_contents(key, flag_clear_df=False, columns=None):
+  account = current_account()
+
+  account.total = 0
+  account.first = ""
+  account.last = ""
+
+  # switch contact | conversation
+  df = account.df_contact if key == "contacts" else account.df_conversation
+  if df is None: df = empty_frame(key)
+  
+  # check flag to clear df
+  if flag_clear_df : df = df.iloc[0:0]
+  # projected syncs keep only the requested columns, full syncs restore all of them
+  columns_wanted = frame_columns[key] if columns is None else list(columns) + ['cursor']
+  if list(df.columns[:len(columns_wanted)]) != columns_wanted: df = df.reindex(columns=columns_wanted)
+  return df, RowBuffer(df.columns)
+
+# build the frame once per sync
+def finish_contents(key, df, buffer):
+  account = current_account()
+
+  with account.metrics.timer("build", frame=key, rows=len(buffer)), get_profiler().phase("build"):
+    if key == "contacts":
+      df = apply_schema(buffer.to_frame(df), CONTACT_SCHEMA, "contacts", account.metrics)
+      account.df_contact = df
+      with get_profiler().phase("pointers"):
+        build_pointers()
+    else:
+      df = apply_schema(buffer.to_frame(df), CONVERSATION_SCHEMA, "conversations", account.metrics)
+      account.df_conversation = df
+      enrich_contacts()
+
+  return df
+
+# start collecting normalized messages
+def start_messages(flag_clear_df=False):
+  df_message = current_account().df_message
+  df = empty_frame("messages") if flag_clear_df or df_message is None else df_message
+  return df, RowBuffer(df.columns)
+
+# build the messages frame once per sync
+def finish_messages(df, messages):
+  account = current_account()
+
+  with account.metrics.timer("build", frame="messages", rows=len(messages)), get_profiler().phase("build"):
+    account.df_message = apply_schema(messages.to_frame(df), MESSAGE_SCHEMA, "messages", account.metrics)
+
+  return account.df_message
+
+
+# get all conversations & contacts
+def get_all_contents(key, 
+  page=DOWNLOAD_STEP, 
+  cursor=None, 
+  next_flag=True, 
+  flag_conversation_multiple=True, 
+  flag_clear_df=False,
+  flag_last_order=True,
+  on_page=None,
+  flag_bidirectional=False,
+  checkpoint=None,
+  flag_incremental=False,
+  columns=None,
+  flag_stream=False,
+  flag_adaptive=False,
+  flag_conversation_normalized=False,
+  flag_full_history=True):
+
+  account = current_account()
+  df, buffer = start_contents(key, flag_clear_df, columns)
+  # normalized conversations keep their messages in a separate table
+  messages = None
+  if flag_conversation_normalized and key == "conversations":
+    df_messages, messages = start_messages(flag_clear_df)
+  sizer = PageSizer(page) if flag_adaptive else None
+
+  # checkpoints & streaming follow single direction crawls only
+  if flag_bidirectional:
+    checkpoint = None
+    flag_stream = False
+
+  # resume an unfinished crawl | stop at the previous high-water mark
+  state = checkpoint.get(key, account.get_api_key()) if checkpoint is not None else {}
+  if cursor is None and state.get('complete') is False:
+    cursor = state.get('cursor')
+    account.metrics.emit("resume", key=key, cursor=cursor)
+  stop_cursor = state.get('high_water') if flag_incremental else None
+  from_head = cursor is None
+  account.complete[key] = False
+
+  # streamed edges are converted as they arrive, up to the high-water mark;
+  # edges with truncated messages | tags wait for the end of their page
+  stream_reached = []
+  stream_truncated = []
+  # a bidirectional crawl that missed records of the total
+  incomplete = []
+  def on_edge(data):
+    if data['cursor'] == stop_cursor: stream_reached.append(data['cursor'])
+    if len(stream_reached) == 0:
+      if flag_full_history and is_truncated(data['node'], NESTED_KEYS[key]):
+        stream_truncated.append(data)
+      else:
+        convert_edge(key, data, buffer, flag_conversation_multiple, columns, messages)
+
+  # switch one direction | both directions | streaming
+  if flag_bidirectional:
+    pages = iter_pages_bidirectional(key=key, page=page, columns=columns, incomplete=incomplete)
+  elif flag_stream:
+    pages = iter_pages_stream(
+      key=key,
+      page=page,
+      cursor=cursor,
+      direction="last" if flag_last_order else "first",
+      next_flag=next_flag,
+      seen=account.cursors,
+      columns=columns,
+      on_edge=on_edge)
+  else:
+    pages = iter_pages(
+      key=key,
+      page=page,
+      cursor=cursor,
+      direction="last" if flag_last_order else "first",
+      next_flag=next_flag,
+      seen=account.cursors,
+      columns=columns,
+      sizer=sizer)
+
+  # Execute the query contacts
+  try:
+    stopped = False
+    reached = False
+    for datas in get_profiler().iterate("fetch", pages):
+      # incremental sync only keeps records newer than the high-water mark
+      reached = False
+      if stop_cursor is not None:
+        page_cursors = [data['cursor'] for data in datas]
+        if stop_cursor in page_cursors:
+          datas = datas[:page_cursors.index(stop_cursor)]
+          reached = True
+
+      # streamed pages only complete the edges on_edge held back
+      if flag_full_history:
+        with get_profiler().phase("fetch"):
+          complete_nested(key, stream_truncated if flag_stream else datas)
+
+      convert_start = time.perf_counter()
+      with get_profiler().phase("convert"):
+        convert_page(key, stream_truncated if flag_stream else datas, buffer, flag_conversation_multiple, columns, messages)
+      del stream_truncated[:]
+      account.metrics.page(len(datas), time.perf_counter() - convert_start, first=account.first, last=account.last, buffered=len(buffer))
+
+      if checkpoint is not None and len(datas) > 0:
+        high_water = datas[0]['cursor'] if from_head else None
+        checkpoint.save_page(key, account.get_api_key(), datas[len(datas)-1]['cursor'], high_water)
+        from_head = False
+
+      # page callback can stop the crawl early by returning False
+      if callable(on_page) and on_page(datas) is False:
+        stopped = True
+        break
+      if reached:
+        break
+
+    if checkpoint is not None and next_flag and not stopped:
+      checkpoint.complete(key, account.get_api_key())
+    # resumed, incremental, one page, stopped & short bidirectional crawls only hold part of the records
+    account.complete[key] = cursor is None and next_flag and not stopped and not reached and len(stream_reached) == 0 and len(incomplete) == 0
+  except Exception as e:
+    account.metrics.error(key, e)
+    print(e)
+
+  if sizer is not None:
+    account.page_sizes[key] = sizer.page
+    account.metrics.emit("page_size", key=key, page=sizer.page, settled=True)
+
+  if messages is not None: finish_messages(df_messages, messages)
+  return finish_contents(key, df, buffer)
+
+# build the mutation to remove conversation & contact
+def remove_query(key, id):
+  # switch contact | conversation
+  if key == "contacts":
+    return mutation_remove_contact(id=id)
+  else:
+    return mutation_remove_conversation(id=id)
+
+# remove conversation & contact
+def remove_content(key, id):
+  try:
+    result = run_query(*remove_query(key, id))
+  except Exception as e:
+    print(e)
+    result = None
+  
+  return result
+
+# send message
+def send_message(phone, message):
+  try:
+    result = run_query(*mutation_send_message(phone=phone, message=message))
+  except Exception as e:
+    print(e)
+    result = None
+  
+  return result
+
+
+# check whether the server rejected a batch for being too large
+# only a 413 or a result without data counts, errors next to data belong to single
+# aliases while the others already ran, so the batch must not be sent again.
+def is_batch_too_large(result=None, error=None):
+  if isinstance(error, QueryError):
+    return error.status_code == 413
+  if result is None or result.get('data') is not None:
+    return False
+  messages = [str(e.get('message', '')).lower() for e in result.get('errors') or []]
+  return any(word in message for message in messages for word in ("too large", "complexity", "exceed"))
+
+# error messages of a batch result per alias index, errors without an alias path go to every alias
+def alias_errors(result, size):
+  errors = {}
+  for error in (result or {}).get('errors') or []:
+    path = error.get('path') or []
+    alias = path[0] if len(path) > 0 else None
+    indexes = [int(alias[1:])] if isinstance(alias, str) and alias[1:].isdigit() else range(size)
+    for i in indexes:
+      errors.setdefault(i, []).append(error.get('message'))
+  return errors
+
+# run aliased mutations in batches
+# returns the payload of every input in order, None where it failed;
+# the batch size is halved whenever the server rejects a batch as too large.
+def run_mutation_batches(field, inputs, batch_size=BATCH_SIZE):
+  payloads = []
+  index = 0
+
+  while index < len(inputs):
+    batch = inputs[index:index+batch_size]
+    variables = {"input{}".format(i): input for i, input in enumerate(batch)}
+    try:
+      result, error = run_query(batch_operation(field, len(batch)), variables), None
+    except Exception as e:
+      result, error = None, e
+
+    if batch_size > 1 and is_batch_too_large(result, error):
+      batch_size = max(1, batch_size // 2)
+      current_account().metrics.emit("batch_size", field=field, size=batch_size)
+      continue
+
+    # a partial result keeps the payloads of the aliases that succeeded
+    if error is not None: print(error)
+    for i, messages in sorted(alias_errors(result, len(batch)).items()):
+      print("input", index + i, "failed:", join_with_none(messages))
+    data = (result or {}).get('data') or {}
+    payloads.extend(data.get("m{}".format(i)) for i in range(len(batch)))
+    index = index + len(batch)
+
+  return payloads
+
+# remove many conversations | contacts, returns (id, payload) pairs
+def remove_contents(key, ids, batch_size=BATCH_SIZE):
+  ids = list(ids)
+  if key == "contacts":
+    inputs = [input_remove_contact(id) for id in ids]
+    field = "removeContact"
+  else:
+    inputs = [input_remove_conversation(id) for id in ids]
+    field = "removeConversation"
+
+  return list(zip(ids, run_mutation_batches(field, inputs, batch_size)))
+
+# send many messages from (phone, message) pairs, returns ((phone, message), payload) pairs
+def send_messages(pairs, batch_size=BATCH_SIZE):
+  pairs = list(pairs)
+  inputs = [input_send_message(phone, message) for phone, message in pairs]
+
+  return list(zip(pairs, run_mutation_batches("sendMessage", inputs, batch_size)))
+
+
+# columns to upload, projected syncs upload the requested columns without id
+def upload_columns(df, first_column, last_column, columns=None):
+  if columns is None: return df.loc[:,first_column:last_column]
+  return df.loc[:,[column for column in columns if column != 'id']]
+
+
+# gspread spreadsheet of the current account, SPREAD in .env by default
+def open_spread(sheet_name):
+  from gspread_pandas import Spread
+  return Spread(current_account().get_spread(), sheet=sheet_name, create_sheet=True)
+
+def open_worksheet(sheet_name):
+  return open_spread(sheet_name).sheet
+
+# upload a frame to a worksheet, only the rows changed since the last upload when isDiff
+# accounts with their own spreadsheet keep their own diff snapshots
+# a partial frame (resumed, incremental or projected sync) only inserts & updates rows
+def upload_sheet(df, sheet_name, isClear, ids=None, isDiff=False, isPartial=False):
+  account = current_account()
+  df = sheet_frame(df)
+  if isDiff and ids is not None:
+    from .sheet_diff import SnapshotStore, SNAPSHOT_FILE, upload_diff
+    snapshot = None
+    if account.spread is not None:
+      snapshot = SnapshotStore("{}.{}".format(SNAPSHOT_FILE, hashlib.sha1(account.spread.encode("utf-8")).hexdigest()[:12]))
+    inserts, updates, deletes = upload_diff(df, list(ids), open_worksheet(sheet_name), sheet_name, snapshot, partial=isPartial)
+    account.metrics.emit("diff", sheet=sheet_name, inserts=inserts, updates=updates, deletes=deletes)
+  elif account.spread is not None:
+    open_spread(sheet_name).df_to_sheet(df, index=False, sheet=sheet_name, replace=isClear)
+  else:
+    from gspread_pandas import upload_with_pd
+    upload_with_pd(df, sheet_name, isClear)
+
+
+# print the metrics summary of the sync and write it to the metrics path
+# {account} in the path is replaced by the account name
+def report_metrics():
+  account = current_account()
+  summary = account.metrics.summary()
+  print("sync metrics", summary['counters'])
+  path = metrics_path or get_config().get('METRICS_PATH')
+  if path: account.metrics.write(path.format(collection=summary['collection'], account=account.label()))
+  return summary
+
+
+# get & upload & save contacts & pointers
+# page defaults to PAGE_STEP for the one page of isClear, DOWNLOAD_STEP for a crawl
+def get_upload_contacts(isClear=False, isSave=False, isUpload=True, cursor=None, page=None, on_page=None, isBidirectional=False, checkpoint=None, isIncremental=False, columns=None, isStream=False, isAdaptive=False, isDiff=False, isFullHistory=True, layout=None):
+  account = current_account()
+  account.cursors = set()
+  account.metrics.reset("contacts")
+  get_profiler().reset("{}-contacts".format(account.label()))
+
+  print("start to get contacts...")
+  if isClear :
+    get_all_contents(
+      key="contacts",
+      page=page or PAGE_STEP, 
+      cursor=cursor, 
+      next_flag=False, 
+      flag_conversation_multiple=False,
+      flag_clear_df=True,
+      on_page=on_page,
+      columns=columns,
+      flag_full_history=isFullHistory)
+  else:
+    get_all_contents(
+      key="contacts",
+      page=page or DOWNLOAD_STEP,
+      on_page=on_page,
+      flag_bidirectional=isBidirectional,
+      checkpoint=checkpoint,
+      flag_incremental=isIncremental,
+      columns=columns,
+      flag_stream=isStream,
+      flag_adaptive=isAdaptive,
+      flag_full_history=isFullHistory)
+  # print(df_contact)
+  # print(df_pointers)
+  print("end to get contacts and pointers.")
+
+  if isSave and callable(save_contacts) :
+    with get_profiler().phase("save"):
+      save_contacts(account.df_contact)
+    print("end to upload contacts.")
+
+  if isSave and callable(save_pointers) :
+    with get_profiler().phase("save"):
+      save_pointers(account.df_pointers)
+    print("end to upload pointers.")
+
+  if isUpload :
+    with account.metrics.timer("upload", sheet="Contacts"), get_profiler().phase("upload"):
+      ids = account.df_contact['id'] if 'id' in account.df_contact else None
+      is_partial = isClear or columns is not None or not account.complete.get("contacts")
+      upload_sheet(apply_layout(upload_columns(account.df_contact, 'Name', 'Etc', columns), "contacts", layout), "Contacts", isClear, ids, isDiff, is_partial)
+    # the grid of a partial crawl would replace the whole sheet with some of the contacts
+    if columns is None and account.complete.get("contacts"):
+      with account.metrics.timer("upload", sheet="Pointers"), get_profiler().phase("upload"):
+        upload_sheet(account.df_pointers, "Pointers", True)
+    elif columns is None:
+      account.metrics.emit("skip", sheet="Pointers", reason="partial contacts")
+    print("end to upload contacts and pointers.")
+
+  report_metrics()
+  get_profiler().report()
+  return account.df_contact, account.total, account.last
+
+# get & upload & save conversations
+# isNormalized keeps one row per conversation and uploads the messages to their own sheet
+def get_upload_conversations(isClear=False, isSave=False, isUpload=True, cursor=None, page=None, on_page=None, isBidirectional=False, checkpoint=None, isIncremental=False, columns=None, isStream=False, isAdaptive=False, isDiff=False, isNormalized=False, isFullHistory=True, layout=None):
+  account = current_account()
+  account.cursors = set()
+  account.metrics.reset("conversations")
+  get_profiler().reset("{}-conversations".format(account.label()))
+
+  print("start to get conversations...")
+  if isClear :
+    get_all_contents(
+      key="conversations",
+      page=page or PAGE_STEP, 
+      cursor=cursor, 
+      next_flag=False, 
+      flag_conversation_multiple=False,
+      flag_clear_df=True,
+      on_page=on_page,
+      columns=columns,
+      flag_conversation_normalized=isNormalized,
+      flag_full_history=isFullHistory)
+  else :
+    get_all_contents(
+      key="conversations",
+      page=page or DOWNLOAD_STEP,
+      on_page=on_page,
+      flag_bidirectional=isBidirectional,
+      checkpoint=checkpoint,
+      flag_incremental=isIncremental,
+      columns=columns,
+      flag_stream=isStream,
+      flag_adaptive=isAdaptive,
+      flag_conversation_normalized=isNormalized,
+      flag_full_history=isFullHistory)
+  # print(df_conversation)
+  print("end to get conversations.")
+
+  if isSave and callable(save_conversations) :
+    with get_profiler().phase("save"):
+      save_conversations(account.df_conversation)
+    print("end to save conversations.")
+  
+  if isUpload :
+    with account.metrics.timer("upload", sheet="Messages"), get_profiler().phase("upload"):
+      ids = account.df_conversation['id'] if 'id' in account.df_conversation else None
+      is_partial = isClear or columns is not None or not account.complete.get("conversations")
+      upload_sheet(apply_layout(upload_columns(account.df_conversation, 'Name', 'Phone', columns), "conversations", layout), "Messages", isClear, ids, isDiff, is_partial)
+    if isNormalized:
+      df_message = account.df_message
+      with account.metrics.timer("upload", sheet="Message History"), get_profiler().phase("upload"):
+        upload_sheet(df_message[['conversation_id', 'direction', 'body', 'createdAt']], "Message History", isClear, df_message['id'], isDiff, is_partial)
+    print("end to upload conversations.")
+
+  report_metrics()
+  get_profiler().report()
+  return account.df_conversation, account.total, account.last
+
+
+# async api
+# queries run on a thread pool through the same pooled client, so sync and
+# async calls share one connection pool; a semaphore bounds concurrency.
+async_concurrency = ASYNC_CONCURRENCY
+async_executor = None
+async_semaphores = {}
+
+# change the number of concurrent async queries
+def configure_async(concurrency=ASYNC_CONCURRENCY):
+  global async_concurrency, async_executor
+  async_concurrency = concurrency
+  if async_executor is not None:
+    async_executor.shutdown(wait=False)
+  async_executor = None
+  async_semaphores.clear()
+
+# semaphore of the running event loop
+def get_async_semaphore():
+  loop = asyncio.get_running_loop()
+  semaphore = async_semaphores.get(loop)
+  if semaphore is None:
+    semaphore = async_semaphores[loop] = asyncio.Semaphore(async_concurrency)
+  return semaphore
+
+# run a blocking function of the sync api on the async executor, in the context
+# of the caller so it works on the same account
+async def run_async(function, *args, **kwargs):
+  global async_executor
+  if async_executor is None:
+    async_executor = ThreadPoolExecutor(max_workers=async_concurrency)
+  async with get_async_semaphore():
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(async_executor, contextvars.copy_context().run, functools.partial(function, *args, **kwargs))
+
+# run query without blocking the event loop
+async def run_query_async(query, variables=None):
+  return await run_async(run_query, query, variables)
+
+# async iter_pages, each page is fetched on the async executor
+async def iter_pages_async(key, **options):
+  pages = iter_pages(key, **options)
+  while True:
+    datas = await run_async(next, pages, None)
+    if datas is None: return
+    yield datas
+
+# async complete_nested
+async def complete_nested_async(key, datas, **options):
+  return await run_async(complete_nested, key, datas, **options)
+
+# async get_all_contents, the crawl runs on the async executor with all of its options
+async def get_all_contents_async(key, **options):
+  return await run_async(get_all_contents, key, **options)
+
+# remove conversation & contact
+async def remove_content_async(key, id):
+  try:
+    result = await run_query_async(*remove_query(key, id))
+  except Exception as e:
+    print(e)
+    result = None
+  
+  return result
+
+# send message
+async def send_message_async(phone, message):
+  try:
+    result = await run_query_async(*mutation_send_message(phone=phone, message=message))
+  except Exception as e:
+    print(e)
+    result = None
+  
+  return result
+
+# get & upload conversations, then contacts, without blocking the event loop
+# both collections share the cursors, totals & contact activity of the account, so
+# they run one after the other, conversations first like the accounts runner; the
+# requests of each crawl still run concurrently through the client.
+async def get_upload_all_async(isUpload=True, page=None, isNormalized=False, **options):
+  df_conversations, total, last = await run_async(get_upload_conversations, isUpload=isUpload, page=page, isNormalized=isNormalized, **options)
+  df_contacts, total, last = await run_async(get_upload_contacts, isUpload=isUpload, page=page, **options)
+  return df_contacts, df_conversations
+
+
+# set save pointers callback
+def set_save_pointers(callback_func):
+  global save_pointers
+  save_pointers = callback_func
+
+# set save contacts callback
+def set_save_contacts(callback_func):
+  global save_contacts
+  save_contacts = callback_func
+
+# set save conversations callback
+def set_save_conversations(callback_func):
+  global save_conversations
+  save_conversations = callback_func
\ No newline at end of file
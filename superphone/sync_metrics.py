@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+
+logger = logging.getLogger("superphone.metrics")
+
+# counters & timed phases of a sync
+METRIC_COUNTERS = ("requests", "retries", "errors", "throttles", "pages", "records", "bytes")
+METRIC_PHASES = ("request", "convert", "build", "upload")
+
+
+# event emitter collecting the metrics of one sync
+# every emitted event is logged as one json line and handed to the hooks
+# registered with on(); request, page & phase events also feed the summary.
+class SyncMetrics:
+  def __init__(self):
+    self.hooks = {}
+    self.lock = threading.Lock()
+    # gauges are current values, e.g. the adaptive concurrency, and outlive reset
+    self.gauges = {}
+    self.reset()
+
+  # start a new summary, e.g. at the start of a sync
+  def reset(self, collection=None):
+    with self.lock:
+      self.collection = collection
+      self.started = time.time()
+      self.counters = {name: 0 for name in METRIC_COUNTERS}
+      self.phases = {name: [0, 0.0, 0.0] for name in METRIC_PHASES} # count, seconds sum, seconds max
+
+  # register a hook for an event, "*" for every event
+  def on(self, event, hook):
+    self.hooks.setdefault(event, []).append(hook)
+    return hook
+
+  def off(self, event, hook):
+    if hook in self.hooks.get(event, []): self.hooks[event].remove(hook)
+
+  def emit(self, event, **fields):
+    fields = dict(fields, event=event, collection=self.collection, time=round(time.time(), 3))
+    logger.info(json.dumps(fields, default=str))
+    for hook in self.hooks.get(event, []) + self.hooks.get("*", []):
+      hook(fields)
+
+  def count(self, name, value=1):
+    with self.lock:
+      self.counters[name] = self.counters.get(name, 0) + value
+
+  def gauge(self, name, value):
+    with self.lock:
+      self.gauges[name] = value
+
+  def observe(self, phase, seconds):
+    with self.lock:
+      values = self.phases.setdefault(phase, [0, 0.0, 0.0])
+      values[0] = values[0] + 1
+      values[1] = values[1] + seconds
+      values[2] = max(values[2], seconds)
+
+  # one http response
+  def request(self, operation, latency, size, status):
+    self.count("requests")
+    self.count("bytes", size)
+    self.observe("request", latency)
+    if status != 200: self.count("errors")
+    self.emit("request", operation=operation, latency=round(latency, 4), bytes=size, status=status)
+
+  def retry(self, operation, attempt):
+    self.count("retries")
+    self.emit("retry", operation=operation, attempt=attempt)
+
+  def error(self, operation, error):
+    self.count("errors")
+    self.emit("error", operation=operation, error=str(error))
+
+  # the api pushed back, the request limit is now `concurrency`
+  def throttle(self, reason, concurrency, wait=0):
+    self.count("throttles")
+    self.gauge("concurrency", concurrency)
+    self.emit("throttle", reason=reason, concurrency=concurrency, wait=round(wait, 3))
+
+  # one converted page, fields such as the cursors go to the event
+  def page(self, records, seconds, **fields):
+    self.count("pages")
+    self.count("records", records)
+    self.observe("convert", seconds)
+    self.emit("page", records=records, convert_seconds=round(seconds, 4), **fields)
+
+  # time a phase of the sync
+  @contextmanager
+  def timer(self, phase, **fields):
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      seconds = time.perf_counter() - start
+      self.observe(phase, seconds)
+      self.emit(phase, seconds=round(seconds, 4), **fields)
+
+  def summary(self):
+    with self.lock:
+      return {
+        'collection': self.collection,
+        'seconds': round(time.time() - self.started, 3),
+        'counters': dict(self.counters),
+        'gauges': dict(self.gauges),
+        'phases': {name: {'count': count, 'seconds': round(total, 4), 'max_seconds': round(most, 4)} for name, (count, total, most) in self.phases.items()},
+      }
+
+  # prometheus text exposition of the summary, for the node exporter textfile collector
+  def prometheus(self):
+    summary = self.summary()
+    label = '{{collection="{}"}}'.format(summary['collection'] or "")
+    lines = []
+    for name, value in summary['counters'].items():
+      lines.append("# TYPE superphone_sync_{}_total counter".format(name))
+      lines.append("superphone_sync_{}_total{} {}".format(name, label, value))
+    for name, values in summary['phases'].items():
+      lines.append("# TYPE superphone_sync_{}_seconds summary".format(name))
+      lines.append("superphone_sync_{}_seconds_count{} {}".format(name, label, values['count']))
+      lines.append("superphone_sync_{}_seconds_sum{} {}".format(name, label, values['seconds']))
+    for name, value in summary['gauges'].items():
+      lines.append("# TYPE superphone_sync_{} gauge".format(name))
+      lines.append("superphone_sync_{}{} {}".format(name, label, value))
+    lines.append("# TYPE superphone_sync_duration_seconds gauge")
+    lines.append("superphone_sync_duration_seconds{} {}".format(label, summary['seconds']))
+    return "\n".join(lines) + "\n"
+
+  # write the summary as prometheus text (.prom) or json, through a temporary file
+  def write(self, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+      if path.endswith(".prom"):
+        f.write(self.prometheus())
+      else:
+        json.dump(self.summary(), f, indent=2)
+    os.replace(tmp_path, path)
@@ -0,0 +1,123 @@
+import os
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+
+PROFILE_TOP = 10 # functions & allocation sites in the reports
+PROFILE_FRAMES = 1 # traceback depth of the allocation sites
+
+# tracemalloc is process wide, it runs while any profiler is open
+open_profilers = [0]
+open_lock = threading.Lock()
+
+
+# phase profiles of one sync
+# each phase gets its own cProfile profile, accumulated over all of its runs, and
+# the peak traced memory of its runs; phases run per page, so the allocation sites
+# that grew come from one tracemalloc snapshot at the start & one at the report.
+# a nested phase pauses the profile of the phase around it. profilers of accounts
+# synced on threads keep their own profiles, but share the allocations they trace.
+class PhaseProfiler:
+  def __init__(self, directory, top=PROFILE_TOP):
+    self.directory = directory
+    self.top = top
+    self.stack = []
+    self.closed = False
+    with open_lock:
+      open_profilers[0] = open_profilers[0] + 1
+      if not tracemalloc.is_tracing(): tracemalloc.start(PROFILE_FRAMES)
+    self.reset()
+
+  def reset(self, name="sync"):
+    self.name = name
+    self.profiles = {}
+    self.seconds = Counter()
+    self.calls = Counter()
+    self.peaks = {}
+    self.start = self.snapshot() if tracemalloc.is_tracing() else None
+
+  def close(self):
+    with open_lock:
+      if self.closed: return
+      self.closed = True
+      open_profilers[0] = open_profilers[0] - 1
+      if open_profilers[0] == 0 and tracemalloc.is_tracing(): tracemalloc.stop()
+
+  # traced allocations without the ones of tracemalloc itself
+  def snapshot(self):
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+  @contextmanager
+  def phase(self, phase):
+    profile = self.profiles.setdefault(phase, cProfile.Profile())
+    if self.stack: self.stack[-1].disable()
+    self.stack.append(profile)
+
+    if hasattr(tracemalloc, 'reset_peak'): tracemalloc.reset_peak()
+    start = time.perf_counter()
+    profile.enable()
+    try:
+      yield
+    finally:
+      profile.disable()
+      self.seconds[phase] += time.perf_counter() - start
+      self.calls[phase] += 1
+      self.peaks[phase] = max(self.peaks.get(phase, 0), tracemalloc.get_traced_memory()[1])
+
+      self.stack.pop()
+      if self.stack: self.stack[-1].enable()
+
+  # iterate with the time spent getting each item counted in the phase
+  def iterate(self, phase, items):
+    items = iter(items)
+    while True:
+      with self.phase(phase):
+        item = next(items, StopIteration)
+      if item is StopIteration: return
+      yield item
+
+  # write <directory>/<time>-<name>/<phase>.prof & alloc.txt and print the hottest functions
+  def report(self):
+    path = os.path.join(self.directory, "{}-{}".format(time.strftime("%Y%m%d-%H%M%S"), self.name))
+    os.makedirs(path, exist_ok=True)
+
+    print("profile of", self.name, "in", path)
+    if self.start is not None and tracemalloc.is_tracing():
+      with open(os.path.join(path, "alloc.txt"), "w") as f:
+        stats = [stat for stat in self.snapshot().compare_to(self.start, 'lineno') if stat.size_diff > 0]
+        for stat in stats[:self.top]:
+          f.write("{:>12} {}\n".format(stat.size_diff, stat.traceback))
+
+    for phase, profile in self.profiles.items():
+      profile.dump_stats(os.path.join(path, phase + ".prof"))
+
+      print("{:<10} {:>8.3f}s {:>6} runs  peak {:>8.1f} MB".format(phase, self.seconds[phase], self.calls[phase], self.peaks[phase] / 1024 / 1024))
+      stats = pstats.Stats(profile).sort_stats("tottime")
+      for (filename, line, function) in stats.fcn_list[:3]:
+        calls, _, tottime, cumtime, _ = stats.stats[(filename, line, function)]
+        print("  {:>8.3f}s {:>8} {}:{}({})".format(tottime, calls, os.path.basename(filename), line, function))
+    return path
+
+
+# stand-in while profiling is off
+class NullProfiler:
+  def reset(self, name="sync"):
+    pass
+
+  def close(self):
+    pass
+
+  @contextmanager
+  def phase(self, phase):
+    yield
+
+  def iterate(self, phase, items):
+    return items
+
+  def report(self):
+    return None
@@ -0,0 +1,48 @@
+import asyncio
+import unittest
+
+from superphone import sync
+from mock_server import start_server
+
+
+TEST_RECORDS = 60
+
+
+# the async api runs the sync crawl on its executor, in the account of the caller
+class AsyncSyncTest(unittest.TestCase):
+  def setUp(self):
+    self.server = start_server(records=TEST_RECORDS, port=0)
+    self.token = sync.use_account(sync.Account(api_key="test-key", name="async"))
+    sync.configure_client(url=self.server.url, headers={"Authorization": "Bearer test-key"})
+
+  def tearDown(self):
+    sync.current_account().client.close()
+    sync.reset_account(self.token)
+    self.server.shutdown()
+    self.server.server_close()
+
+  def test_get_upload_all(self):
+    df_contacts, df_conversations = asyncio.run(sync.get_upload_all_async(isUpload=False, isNormalized=True))
+    account = sync.current_account()
+    self.assertEqual(len(df_contacts), TEST_RECORDS)
+    self.assertEqual(len(df_conversations), TEST_RECORDS)
+    self.assertTrue(account.complete['contacts'] and account.complete['conversations'])
+    # conversations ran first, so the activity columns are filled
+    self.assertEqual(df_contacts['Number of Messages Incoming'].isna().sum(), 0)
+    self.assertEqual(len(account.df_message), sum(len(self.server.data.conversation(i)['messages']) for i in range(TEST_RECORDS)))
+
+  def test_iter_pages(self):
+    async def crawl():
+      return [datas async for datas in sync.iter_pages_async("contacts", page=25)]
+    pages = asyncio.run(crawl())
+    self.assertEqual(sum(len(datas) for datas in pages), TEST_RECORDS)
+
+  def test_mutations(self):
+    async def remove():
+      return await asyncio.gather(*(sync.remove_content_async("contacts", "contact-{}".format(i)) for i in range(5)))
+    results = asyncio.run(remove())
+    self.assertEqual([result['data']['removeContact']['removedContactId'] for result in results], ["contact-{}".format(i) for i in range(5)])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from superphone import sync
+
+
+# SuperphoneClient.post with the http request replaced by canned results
+class PersistedQueryTest(unittest.TestCase):
+  def client(self, reply):
+    client = sync.SuperphoneClient(url="http://localhost/graphql", headers={})
+    self.sent = []
+    def send(query, payload, read_timeout=None):
+      self.sent.append('query' in payload)
+      return reply(payload)
+    client.send = send
+    return client
+
+  def test_query_falls_back_to_text(self):
+    client = self.client(lambda payload: {'data': {'a': 1}} if 'query' in payload else {'data': None, 'errors': [{'message': "Must provide query string"}]})
+    self.assertEqual(client.post(sync.Operation("query A { a }")), {'data': {'a': 1}})
+    self.assertEqual(self.sent, [False, True])
+    self.assertFalse(client.persisted_queries)
+
+  def test_mutation_is_sent_once(self):
+    client = self.client(lambda payload: {'data': None, 'errors': [{'message': "failed"}]})
+    result = client.post(sync.mutation_operation("sendMessage"), {'input': sync.input_send_message("+15550000000", "hi")})
+    self.assertIsNone(result['data'])
+    self.assertEqual(self.sent, [False])
+
+  def test_mutation_unknown_hash(self):
+    client = self.client(lambda payload: {'data': {'m': 1}} if 'query' in payload else {'errors': [{'message': "PersistedQueryNotFound", 'extensions': {'code': "PERSISTED_QUERY_NOT_FOUND"}}]})
+    client.post(sync.mutation_operation("sendMessage"), {'input': sync.input_send_message("+15550000000", "hi")})
+    self.assertEqual(self.sent, [False, True])
+    self.assertTrue(client.persisted_queries)
+
+
+if __name__ == '__main__':
+  unittest.main()
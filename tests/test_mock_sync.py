@@ -0,0 +1,233 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from superphone import sync
+from superphone.checkpoint_store import CheckpointStore
+from mock_server import start_server
+
+
+TEST_RECORDS = 120
+
+
+# in memory worksheet with the calls sheet_diff makes
+class FakeWorksheet:
+  id = 0
+
+  def __init__(self):
+    self.rows = []
+    self.spreadsheet = self
+
+  def clear(self):
+    self.rows = []
+
+  # write rows from the A1 start row on
+  def update(self, start, values):
+    row = int(start[1:].split(":")[0])
+    while len(self.rows) < row - 1 + len(values):
+      self.rows.append([])
+    self.rows[row-1:row-1+len(values)] = [list(values) for values in values]
+
+  def batch_update(self, body):
+    # worksheet range updates | spreadsheet requests
+    if isinstance(body, list):
+      for update in body:
+        self.update(update['range'], update['values'])
+      return
+    for request in body['requests']:
+      del self.rows[request['deleteDimension']['range']['startIndex']]
+
+# spread standing in for gspread_pandas, frames are only recorded
+class FakeSpread:
+  def __init__(self):
+    self.frames = {}
+
+  def df_to_sheet(self, df, index=False, sheet=None, replace=False):
+    self.frames[sheet] = df
+
+
+# syncs against the mock api, each test in its own account & working directory
+class MockSyncTest(unittest.TestCase):
+  def setUp(self):
+    self.server = start_server(records=TEST_RECORDS, port=0)
+    self.directory = tempfile.TemporaryDirectory()
+    self.cwd = os.getcwd()
+    os.chdir(self.directory.name)
+    self.tokens = []
+    self.use_account()
+
+  def tearDown(self):
+    while len(self.tokens) > 0:
+      account = sync.current_account()
+      if account.client is not None: account.client.close()
+      sync.reset_account(self.tokens.pop())
+    os.chdir(self.cwd)
+    self.directory.cleanup()
+    self.server.shutdown()
+    self.server.server_close()
+
+  # a fresh account, like the next run of the sync
+  def use_account(self):
+    account = sync.Account(api_key="test-key", spread="test-spread", name="test")
+    self.tokens.append(sync.use_account(account))
+    sync.configure_client(url=self.server.url, headers={"Authorization": "Bearer test-key"}, retry_wait_multiplier=10, retry_jitter_max=0)
+    return account
+
+  def contact_ids(self, indexes):
+    return ["contact-{}".format(i) for i in indexes]
+
+
+  def test_paging(self):
+    df, total, last = sync.get_upload_contacts(isUpload=False, isFullHistory=False)
+    self.assertEqual(total, TEST_RECORDS)
+    self.assertEqual(sorted(df['id']), sorted(self.contact_ids(range(TEST_RECORDS))))
+
+  def test_page_size(self):
+    sizes = []
+    df, total, last = sync.get_upload_contacts(isUpload=False, page=7, on_page=lambda datas: sizes.append(len(datas)), isFullHistory=False)
+    self.assertEqual(len(df), TEST_RECORDS)
+    self.assertEqual(max(sizes), 7)
+
+  def test_adaptive_paging(self):
+    df, total, last = sync.get_upload_contacts(isUpload=False, isAdaptive=True, isFullHistory=False)
+    self.assertEqual(sorted(df['id']), sorted(self.contact_ids(range(TEST_RECORDS))))
+
+  def test_bidirectional(self):
+    df, total, last = sync.get_upload_conversations(isUpload=False, isBidirectional=True, isNormalized=True)
+    self.assertEqual(len(df), TEST_RECORDS)
+    self.assertEqual(df['id'].nunique(), TEST_RECORDS)
+    messages = sum(len(self.server.data.conversation(i)['messages']) for i in range(TEST_RECORDS))
+    self.assertEqual(len(sync.current_account().df_message), messages)
+
+  def test_stream_full_history(self):
+    df, total, last = sync.get_upload_conversations(isUpload=False, isFullHistory=True)
+    rows = sorted(map(tuple, df.drop(columns=['cursor']).astype(str).values.tolist()))
+    self.use_account()
+    df, total, last = sync.get_upload_conversations(isUpload=False, isStream=True, isFullHistory=True)
+    self.assertEqual(sorted(map(tuple, df.drop(columns=['cursor']).astype(str).values.tolist())), rows)
+    self.assertTrue(sync.current_account().complete['conversations'])
+
+  def test_bidirectional_short_page(self):
+    # a deleted record makes a short page, the crawl still meets in the middle
+    self.server.data.remove("contact-7")
+    df, total, last = sync.get_upload_contacts(isUpload=False, isBidirectional=True, isFullHistory=False)
+    self.assertEqual(sorted(df['id']), sorted(self.contact_ids(i for i in range(TEST_RECORDS) if i != 7)))
+    self.assertTrue(sync.current_account().complete['contacts'])
+
+  def test_bidirectional_incomplete(self):
+    # a total the crawl can't reach leaves it incomplete
+    page = self.server.data.page
+    def inflated(*args, **kwargs):
+      result = page(*args, **kwargs)
+      result['total'] = result['total'] + 1
+      return result
+    with mock.patch.object(self.server.data, "page", inflated):
+      df, total, last = sync.get_upload_contacts(isUpload=False, isBidirectional=True, isFullHistory=False)
+    self.assertEqual(len(df), TEST_RECORDS)
+    self.assertFalse(sync.current_account().complete['contacts'])
+
+
+  def test_incremental(self):
+    checkpoint = CheckpointStore("checkpoints.json")
+    df, total, last = sync.get_upload_contacts(isUpload=False, checkpoint=checkpoint, isIncremental=True, isFullHistory=False)
+    self.assertEqual(len(df), TEST_RECORDS)
+    self.assertTrue(checkpoint.get("contacts", "test-key")['complete'])
+
+    # only the records added since the last run are fetched
+    self.server.data.records = TEST_RECORDS + 7
+    self.use_account()
+    df, total, last = sync.get_upload_contacts(isUpload=False, checkpoint=checkpoint, isIncremental=True, isFullHistory=False)
+    self.assertEqual(sorted(df['id']), sorted(self.contact_ids(range(TEST_RECORDS, TEST_RECORDS + 7))))
+    self.assertFalse(sync.current_account().complete['contacts'])
+
+  def test_resume(self):
+    checkpoint = CheckpointStore("checkpoints.json")
+    df, total, last = sync.get_upload_contacts(isUpload=False, checkpoint=checkpoint, on_page=lambda datas: False, isFullHistory=False)
+    first = set(df['id'])
+    self.assertEqual(len(first), sync.DOWNLOAD_STEP)
+    self.assertFalse(checkpoint.get("contacts", "test-key")['complete'])
+
+    # the next run continues after the last processed cursor
+    self.use_account()
+    df, total, last = sync.get_upload_contacts(isUpload=False, checkpoint=checkpoint, isFullHistory=False)
+    self.assertEqual(first | set(df['id']), set(self.contact_ids(range(TEST_RECORDS))))
+    self.assertEqual(len(first & set(df['id'])), 0)
+    self.assertTrue(checkpoint.get("contacts", "test-key")['complete'])
+
+
+  def test_batch_mutations(self):
+    ids = self.contact_ids(range(30))
+    results = sync.remove_contents("contacts", ids, batch_size=8)
+    self.assertEqual([id for id, payload in results], ids)
+    self.assertEqual([payload['removedContactId'] for id, payload in results], ids)
+    self.assertEqual(self.server.data.removed, set(ids))
+
+  def test_batch_too_large(self):
+    run_query = sync.run_query
+    sizes = []
+    # the api refuses batches of more than 4 aliases
+    def limited(query, variables=None, **options):
+      sizes.append(len(variables))
+      if len(variables) > 4:
+        raise sync.QueryError(413, query)
+      return run_query(query, variables, **options)
+
+    ids = self.contact_ids(range(10))
+    with mock.patch.object(sync, "run_query", limited):
+      results = sync.remove_contents("contacts", ids, batch_size=8)
+    self.assertEqual([payload['removedContactId'] for id, payload in results], ids)
+    self.assertEqual(sizes, [8, 4, 4, 2])
+
+
+  def test_diff_upload(self):
+    worksheet = FakeWorksheet()
+    spread = FakeSpread()
+    def sync_contacts(**options):
+      self.use_account()
+      with mock.patch.object(sync, "open_worksheet", lambda name: worksheet), mock.patch.object(sync, "open_spread", lambda name: spread):
+        return sync.get_upload_contacts(isDiff=True, isFullHistory=False, **options)
+
+    df, total, last = sync_contacts()
+    self.assertEqual(len(worksheet.rows), TEST_RECORDS + 1)
+    self.assertEqual(worksheet.rows[0], list(sync.sheet_frame(sync.upload_columns(df, 'Name', 'Etc')).columns))
+    # dates keep the api format
+    birthday = worksheet.rows[0].index('Birthday')
+    birthdays = {row[0]: row[birthday] for row in worksheet.rows[1:]}
+    for i in range(TEST_RECORDS):
+      self.assertEqual(birthdays["First{} Last{}".format(i, i % 97)], self.server.data.contact(i)['birthday'] or "")
+
+    # removed records are deleted from the sheet after a complete crawl
+    self.server.data.remove("contact-3")
+    self.server.data.remove("contact-4")
+    sync_contacts()
+    self.assertEqual(len(worksheet.rows), TEST_RECORDS - 1)
+    names = [row[0] for row in worksheet.rows[1:]]
+    self.assertNotIn("First3 Last3", names)
+
+    # a partial crawl never deletes rows it did not see
+    self.server.data.remove("contact-5")
+    sync_contacts(on_page=lambda datas: False)
+    self.assertEqual(len(worksheet.rows), TEST_RECORDS - 1)
+    self.assertIn("First5 Last5", [row[0] for row in worksheet.rows[1:]])
+
+  def test_pointers_upload(self):
+    spread = FakeSpread()
+    checkpoint = CheckpointStore("checkpoints.json")
+    def sync_contacts():
+      self.use_account()
+      with mock.patch.object(sync, "open_spread", lambda name: spread), mock.patch.object(sync, "open_worksheet", lambda name: FakeWorksheet()):
+        return sync.get_upload_contacts(checkpoint=checkpoint, isIncremental=True, isFullHistory=False)
+
+    sync_contacts()
+    self.assertEqual(spread.frames["Pointers"]['Numbers'].sum(), TEST_RECORDS)
+
+    # an incremental run holds the new contacts only and keeps the pointers sheet
+    self.server.data.records = TEST_RECORDS + 7
+    del spread.frames["Pointers"]
+    sync_contacts()
+    self.assertNotIn("Pointers", spread.frames)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,117 @@
+import time
+import unittest
+
+from superphone import sync
+from superphone.sync_metrics import SyncMetrics
+from superphone.request_limiter import AdaptiveLimiter, budget_wait, retry_after, is_throttled, LIMIT_SLOW_SAMPLES
+from mock_server import start_server
+
+
+# AdaptiveLimiter driven by hand, without requests
+class AdaptiveLimiterTest(unittest.TestCase):
+  def limiter(self, **kwargs):
+    self.metrics = SyncMetrics()
+    self.throttles = []
+    self.metrics.on("throttle", self.throttles.append)
+    return AdaptiveLimiter(metrics=self.metrics, **kwargs)
+
+  def test_additive_increase(self):
+    limiter = self.limiter(initial=4)
+    starts = [limiter.acquire() for _ in range(4)]
+    # only a response while every slot is taken grows the limit
+    limiter.release(starts.pop(), 0.1, status=200)
+    self.assertEqual(limiter.limit, 4.25)
+    limiter.release(starts.pop(), 0.1, status=200)
+    self.assertEqual(limiter.limit, 4.25)
+    self.assertEqual(self.throttles, [])
+
+  def test_multiplicative_decrease_once_per_round_trip(self):
+    limiter = self.limiter(initial=8)
+    starts = [limiter.acquire() for _ in range(3)]
+    for started in starts:
+      limiter.release(started, 0.1, status=429)
+    # requests sent before the cut don't cut again
+    self.assertEqual(limiter.concurrency(), 4)
+    limiter.release(limiter.acquire(), 0.1, status=429)
+    self.assertEqual(limiter.concurrency(), 2)
+    self.assertEqual(self.metrics.gauges['concurrency'], 2)
+    self.assertEqual(len(self.throttles), 4)
+
+  def test_retry_after_pauses_acquire(self):
+    limiter = self.limiter(initial=4)
+    limiter.release(limiter.acquire(), 0.1, status=429, headers={'Retry-After': "0.3"})
+    start = time.monotonic()
+    limiter.release(limiter.acquire(), 0.1, status=200)
+    self.assertGreaterEqual(time.monotonic() - start, 0.25)
+    self.assertEqual(self.throttles[0]['wait'], 0.3)
+
+  def test_throttled_result(self):
+    limiter = self.limiter(initial=4)
+    result = {'data': None, 'errors': [{'message': "Throttled", 'extensions': {'code': "THROTTLED"}}]}
+    self.assertTrue(is_throttled(result))
+    limiter.release(limiter.acquire(), 0.1, status=200, result=result)
+    self.assertEqual(limiter.concurrency(), 2)
+    self.assertEqual(self.throttles[0]['reason'], "throttled")
+
+  def test_connection_error(self):
+    limiter = self.limiter(initial=4)
+    limiter.release(limiter.acquire(), 0.1, status=None)
+    self.assertEqual(limiter.concurrency(), 2)
+    self.assertEqual(limiter.inflight, 0)
+
+  def test_slow_responses(self):
+    limiter = self.limiter(initial=4)
+    limiter.release(limiter.acquire(), 0.5, "getContacts/2", status=200)
+    for i in range(LIMIT_SLOW_SAMPLES * 4):
+      if limiter.concurrency() < 4: break
+      limiter.release(limiter.acquire(), 30.0, "getContacts/2", status=200)
+    self.assertEqual(limiter.concurrency(), 2)
+    self.assertEqual(self.throttles[0]['reason'], "latency")
+    # fast responses below the floor never count as slow
+    limiter = self.limiter(initial=4)
+    limiter.release(limiter.acquire(), 0.001, "getContacts/2", status=200)
+    for i in range(LIMIT_SLOW_SAMPLES * 4):
+      limiter.release(limiter.acquire(), 0.5, "getContacts/2", status=200)
+    self.assertEqual(limiter.concurrency(), 4)
+
+  def test_budget_wait(self):
+    status = {'maximumAvailable': 100, 'currentlyAvailable': 5, 'restoreRate': 10}
+    self.assertEqual(budget_wait({'cost': {'requestedQueryCost': 1, 'throttleStatus': status}}), 0.5)
+    self.assertIsNone(budget_wait({'cost': {'requestedQueryCost': 1, 'throttleStatus': dict(status, currentlyAvailable=50)}}))
+    self.assertEqual(budget_wait({'rateLimit': {'limit': 100, 'remaining': 2, 'resetAt': 3}}), 3.0)
+    self.assertIsNone(budget_wait({}))
+
+    limiter = self.limiter(initial=4)
+    limiter.release(limiter.acquire(), 0.1, status=200, result={'data': {}, 'extensions': {'cost': {'requestedQueryCost': 1, 'throttleStatus': dict(status, restoreRate=100)}}})
+    self.assertEqual(limiter.concurrency(), 2)
+    self.assertEqual(self.throttles[0]['reason'], "cost")
+
+  def test_retry_after_header(self):
+    self.assertEqual(retry_after({'Retry-After': "2.5"}), 2.5)
+    self.assertEqual(retry_after({'Retry-After': "Wed, 21 Oct 2015 07:28:00 GMT"}), 0)
+    self.assertEqual(retry_after({}), 0)
+
+
+# a sync against the rate limited mock api
+class RateLimitedSyncTest(unittest.TestCase):
+  def test_sync_under_rate_limit(self):
+    server = start_server(records=150, port=0, rate_limit=10)
+    token = sync.use_account(sync.Account(api_key="test-key", name="limited"))
+    try:
+      client = sync.configure_client(url=server.url, headers={"Authorization": "Bearer test-key"}, retry_wait_multiplier=10, retry_jitter_max=0)
+      concurrency = [client.limiter.concurrency()]
+      client.metrics.on("throttle", lambda event: concurrency.append(event['concurrency']))
+      df, total, last = sync.get_upload_contacts(isUpload=False, page=5, isFullHistory=False)
+
+      self.assertEqual(sorted(df['id']), sorted("contact-{}".format(i) for i in range(150)))
+      self.assertGreater(client.metrics.counters['throttles'], 0)
+      self.assertLess(min(concurrency), concurrency[0])
+    finally:
+      sync.current_account().client.close()
+      sync.reset_account(token)
+      server.shutdown()
+      server.server_close()
+
+
+if __name__ == '__main__':
+  unittest.main()
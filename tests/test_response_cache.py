@@ -0,0 +1,99 @@
+import os
+import time
+import tempfile
+import unittest
+
+from superphone import sync
+from superphone.response_cache import ResponseCache, CacheMiss
+
+
+# ResponseCache with a counting fetch in place of the network
+class ResponseCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.fetched = []
+
+  def tearDown(self):
+    self.directory.cleanup()
+
+  def cache(self, **kwargs):
+    kwargs.setdefault('scope', "key-1")
+    return ResponseCache(path=self.directory.name, **kwargs)
+
+  def fetch(self, query, variables):
+    self.fetched.append((query.name, variables))
+    return {'data': {'page': len(self.fetched)}}
+
+  def files(self):
+    return [name for name in os.listdir(self.directory.name) if name.endswith(".msgpack")]
+
+  def contacts(self, cache, cursor):
+    return cache.run(*sync.query_get_contacts(page=10, cursor=cursor), self.fetch)
+
+  def conversations(self, cache, cursor):
+    return cache.run(*sync.query_get_conversations(page=10, cursor=cursor), self.fetch)
+
+
+  def test_cache_hit(self):
+    cache = self.cache()
+    first = self.contacts(cache, "1")
+    self.assertEqual(self.contacts(cache, "1"), first)
+    self.assertEqual(len(self.fetched), 1)
+    # a new cache reads the file of the first one
+    self.assertEqual(self.contacts(self.cache(), "1"), first)
+    self.assertEqual(len(self.fetched), 1)
+
+  def test_ttl(self):
+    cache = self.cache(ttl={'contacts': 0.05})
+    self.contacts(cache, "1")
+    time.sleep(0.1)
+    self.contacts(cache, "1")
+    self.assertEqual(len(self.fetched), 2)
+
+  def test_record_replay(self):
+    recorder = self.cache(mode="record")
+    self.contacts(recorder, "1")
+    self.contacts(recorder, "1")
+    self.assertEqual(len(self.fetched), 2)
+
+    # replay reads expired entries and never fetches
+    replay = self.cache(mode="replay", ttl={'contacts': 0})
+    self.assertEqual(self.contacts(replay, "1"), {'data': {'page': 2}})
+    self.assertRaises(CacheMiss, self.contacts, replay, "2")
+    self.assertRaises(CacheMiss, self.contacts, self.cache(mode="replay", scope="key-2"), "1")
+    self.assertRaises(CacheMiss, replay.run, *sync.mutation_send_message("+15550000000", "hi"), self.fetch)
+    self.assertEqual(len(self.fetched), 2)
+
+  def test_eviction(self):
+    cache = self.cache()
+    self.contacts(cache, "0")
+    size = cache.size
+    cache.disk_bytes = size * 3
+    for cursor in range(1, 6):
+      self.contacts(cache, str(cursor))
+    self.assertLessEqual(cache.size, cache.disk_bytes)
+    self.assertEqual(cache.size, sum(os.path.getsize(os.path.join(self.directory.name, name)) for name in self.files()))
+    # the oldest pages go first
+    self.contacts(cache, "5")
+    self.contacts(cache, "0")
+    self.assertEqual([variables['before'] for name, variables in self.fetched], ["0", "1", "2", "3", "4", "5", "0"])
+
+  def test_mutation_invalidates_its_scope_and_collection(self):
+    cache = self.cache()
+    other = self.cache(scope="key-2")
+    for cursor in ("1", "2", "3"):
+      self.contacts(other, cursor)
+    self.contacts(cache, "1")
+    self.conversations(cache, "1")
+
+    cache.run(*sync.mutation_remove_contact("contact-1"), self.fetch)
+    self.assertEqual(len(self.files()), 4)
+    self.contacts(cache, "1")
+    self.conversations(cache, "1")
+    self.contacts(other, "1")
+    self.assertEqual([name for name, variables in self.fetched].count("getContacts"), 5)
+    self.assertEqual([name for name, variables in self.fetched].count("getConversations"), 1)
+
+
+if __name__ == '__main__':
+  unittest.main()